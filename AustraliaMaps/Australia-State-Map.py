@@ -21,34 +21,464 @@ get an API key from https://myprojects.geoapify.com/projects
 
 import requests
 import os
+import sys
+import codecs
+import hashlib
+import re
+import threading
+import time
+import platform
+import tracemalloc
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
 import geopandas as gpd
+import pandas as pd
+import numpy as np
+import shapely
 import matplotlib.pyplot as plt
+from matplotlib.collections import PathCollection
+from matplotlib.colors import ListedColormap
+from matplotlib.figure import Figure
+from matplotlib.patches import Patch
+from matplotlib.path import Path
 from shapely.geometry import shape
+from shapely.geometry.polygon import orient
 import json
 from dotenv import load_dotenv
 import argparse
-import overpy  # For OpenStreetMap data via Overpass API
+
+try:
+    import pyarrow  # Needed for the GeoParquet geometry cache
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
 
 # Load API key from .env file (only needed for Geoapify)
 load_dotenv()
 API_KEY = os.getenv("GEOAPIFY_API_KEY")
 
+# Geoapify boundary IDs of Australia and its states
+GEOAPIFY_URL = "https://api.geoapify.com/v1/boundaries/consists-of"
+GEOAPIFY_IDS = {
+    "Australia": "51176098d366ab60405902e9a0cc06b73ac0f00101f901743a010000000000c0020b9203094175737472616c6961",
+    "NSW": "51e99499555f52624059f2cb54feeb6a40c0f00101f901315923000000000092030f4e657720536f7574682057616c6573",
+    "Victoria": "51f0deebf5c1126240594479736c984b42c0f00101f901c559230000000000920308566963746f726961",
+    "Queensland": "51f15c2cf5bbd8614059085d56072f7033c0f00101f901335923000000000092030a517565656e736c616e64",
+    "South Australia": "51787ed8a0e911614059132c299cee0640c0f00101f901345923000000000092030f536f757468204175737472616c6961",
+    "Western Australia": "5142b2fa1f224b5e4059678d1dc2f86138c0f00101f90136592300000000009203115765726e204175737472616c6961",
+    "Tasmania": "51910a5391fc58624059624c72f14b0745c0f00101f90174282400000000009203085461736d616e6961",
+    "Northern Territory": "51fa3403b9f4af6040598c068afc447634c0f00101f90132592300000000009203124e6f72746865726e205465727269746f7279",
+    "ACT": "515036b8599a9e624059f3bd32b9e2c241c0f00101f90115ec23000000000092031c4175737472616c69616e204361706974616c205465727269746f7279",
+}
+
+# Australian states and their names in OpenStreetMap ("AU" is the country)
+STATE_MAPPING = {
+    "Australia": "AU",
+    "NSW": "New South Wales",
+    "Victoria": "Victoria",
+    "Queensland": "Queensland",
+    "South Australia": "South Australia",
+    "Western Australia": "Western Australia",
+    "Tasmania": "Tasmania",
+    "Northern Territory": "Northern Territory",
+    "ACT": "Australian Capital Territory",
+}
+
+def region_urls(api_key=API_KEY, base_url=GEOAPIFY_URL):
+    """Geoapify consists-of URL of every region"""
+    return {state: f"{base_url}?id={boundary_id}&geometry=geometry_5000&apiKey={api_key}"
+            for state, boundary_id in GEOAPIFY_IDS.items()}
+
+# Regions the map functions fetch and draw: the Geoapify URL of each region and
+# the OSM name of each state. Drawing a single map without Australia removes it
+# from urls.
+urls = region_urls()
+state_mapping = dict(STATE_MAPPING)
+
+# Regions are fetched concurrently through one shared keep-alive session.
+# Each host has its own limit on requests in flight (the public Overpass
+# server only grants a couple of slots per client), and 429 (Too Many
+# Requests) and 504 (Gateway Timeout) responses are retried with exponential
+# backoff.
+OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+MAX_WORKERS = 9  # One per region
+HOST_LIMITS = {"overpass-api.de": 2, "api.geoapify.com": 4}
+DEFAULT_HOST_LIMIT = 4
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 2  # First retry delay, doubled on every further retry
+RETRY_STATUSES = (429, 504)
+REQUEST_TIMEOUT = 200  # Seconds; Overpass queries ask for a 180 second server timeout
+
+_session = None
+_host_semaphores = {}
+_lock = threading.Lock()
+
+# Stage timing for --profile: while a profile is running, every stage() block
+# adds its wall time to a per-stage record, downloads add the bytes they
+# transferred, and stages run on the main thread record the peak memory
+# (tracemalloc) reached inside them. Stages on worker threads overlap, so
+# their times add up to more than the wall time and they record no peak.
+_profile = None
+_profile_started = None
+_stage_stack = []  # [peak seen in each open main-thread stage]
+
+def start_profile(trace_memory=True):
+    """Start recording stage timings (and peak memory if trace_memory)"""
+    global _profile, _profile_started
+    _profile = {}
+    _stage_stack.clear()
+    _profile_started = time.perf_counter()
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def _stage_record(name):
+    return _profile.setdefault(name, {"calls": 0, "seconds": 0.0, "bytes": 0, "peak_bytes": None})
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as stage `name` while a profile is running"""
+    if _profile is None:
+        yield
+        return
+    tracing = tracemalloc.is_tracing() and threading.current_thread() is threading.main_thread()
+    if tracing:
+        # Fold the peak so far into the enclosing stage before measuring this one
+        if _stage_stack:
+            _stage_stack[-1] = max(_stage_stack[-1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        _stage_stack.append(0)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if tracing:
+            peak = max(_stage_stack.pop(), tracemalloc.get_traced_memory()[1])
+            if _stage_stack:
+                _stage_stack[-1] = max(_stage_stack[-1], peak)
+        with _lock:
+            record = _stage_record(name)
+            record["calls"] += 1
+            record["seconds"] += elapsed
+            if tracing:
+                record["peak_bytes"] = max(record["peak_bytes"] or 0, peak)
+
+def record_bytes(name, count):
+    """Add count transferred bytes to stage `name` while a profile is running"""
+    if _profile is not None:
+        with _lock:
+            _stage_record(name)["bytes"] += count
+
+def stop_profile():
+    """Stop recording and return the report: total wall time, peak memory and the per-stage records"""
+    global _profile
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "total_seconds": time.perf_counter() - _profile_started,
+        "peak_bytes": None,
+        "stages": dict(sorted(_profile.items(), key=lambda item: -item[1]["seconds"])),
+    }
+    if tracemalloc.is_tracing():
+        report["peak_bytes"] = max([tracemalloc.get_traced_memory()[1]] +
+                                   [record["peak_bytes"] or 0 for record in _profile.values()])
+        tracemalloc.stop()
+    _profile = None
+    return report
+
+def get_session():
+    """Return the shared keep-alive session used for all boundary requests"""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=len(HOST_LIMITS) + 1, pool_maxsize=MAX_WORKERS)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+def _host_semaphore(url):
+    """Semaphore limiting the concurrent requests to the host of url"""
+    host = urlparse(url).hostname
+    with _lock:
+        if host not in _host_semaphores:
+            _host_semaphores[host] = threading.BoundedSemaphore(HOST_LIMITS.get(host, DEFAULT_HOST_LIMIT))
+        return _host_semaphores[host]
+
+def request_with_retry(method, url, **kwargs):
+    """Send a request on the shared session, retrying 429/504 responses with exponential backoff"""
+    kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+    for attempt in range(MAX_RETRIES + 1):
+        with _host_semaphore(url):
+            response = get_session().request(method, url, **kwargs)
+        if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+            return response
+        # Release the connection (streamed responses hold it until closed) before backing off
+        response.close()
+
+        # Honour Retry-After when the server sends one, otherwise back off exponentially
+        retry_after = response.headers.get("Retry-After", "")
+        delay = int(retry_after) if retry_after.isdigit() else BACKOFF_SECONDS * 2 ** attempt
+        print(f"HTTP {response.status_code} from {urlparse(url).hostname}, retrying in {delay}s...")
+        time.sleep(delay)
+
 def fetch_boundary_data_geoapify(url):
     """Fetch boundary data from Geoapify API"""
-    response = requests.get(url)
+    try:
+        with stage("fetch.geoapify"):
+            response = request_with_retry("GET", url)
+            record_bytes("fetch.geoapify", len(response.content))
+    except requests.RequestException as e:
+        print(f"Failed to fetch data from {url}: {e}")
+        return None
     if response.status_code == 200:
-        return response.json()
+        with stage("parse.geoapify"):
+            return response.json()
     else:
         print(f"Failed to fetch data from {url}. HTTP status code: {response.status_code}")
         return None
 
-def fetch_boundary_data_osm(state_name, state_code):
-    """Fetch Australian state boundary data using Overpass API"""
-    api = overpy.Overpass()
-    
-    # Use shorter timeouts to prevent hanging
-    api.timeout = 180
+# Overpass responses are parsed as they stream in: each element of the
+# "elements" array is decoded on its own, and the coordinates of its ways go
+# straight into (n, 2) float64 arrays of lon/lat, so only one relation's
+# JSON is held at a time. Split ways are then joined into rings through an
+# index of their endpoints, and inner rings become holes of the outer ring
+# that contains them.
+STREAM_CHUNK_SIZE = 1 << 16
+OSM_GEOMETRY_FORMAT = "rings"  # Part of the cache hash; change it when the GeoJSON built from OSM changes
+
+def iter_overpass_elements(chunks):
+    """Yield the elements of an Overpass JSON response, decoding them one at a time from an iterable of byte chunks"""
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buffer = ""
+    pos = 0
+
+    def read(minimum=1):
+        # Append at least `minimum` more characters; False at the end of the response
+        nonlocal buffer
+        added = 0
+        for chunk in chunks:
+            text = text_decoder.decode(chunk)
+            buffer += text
+            added += len(text)
+            if added >= minimum:
+                return True
+        buffer += text_decoder.decode(b"", final=True)
+        return added > 0
+
+    def check_remark(start):
+        # Overpass reports runtime errors (timeouts, out of memory) with HTTP 200,
+        # in a "remark" after the elements, which then stop early or are missing
+        while read():
+            pass
+        match = re.compile(r'"remark"\s*:\s*').search(buffer, start)
+        if match:
+            remark = decoder.raw_decode(buffer, match.end())[0]
+            if isinstance(remark, str) and remark.startswith("runtime error"):
+                raise RuntimeError(f"Overpass {remark}")
+
+    # Skip the header up to the opening bracket of the elements array
+    while True:
+        match = re.search(r'"elements"\s*:\s*\[', buffer)
+        if match:
+            pos = match.end()
+            break
+        if not read():
+            check_remark(0)
+            return
+
+    while True:
+        # Skip whitespace and separators between elements
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer) or not read():
+                break
+        if pos >= len(buffer) or buffer[pos] == "]":
+            check_remark(pos)
+            return
+
+        try:
+            element, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # The element is incomplete: at least double what is buffered before
+            # trying again, so large relations are decoded a bounded number of times
+            if not read(len(buffer) - pos):
+                raise
+            continue
+        yield element
+        pos = end
+        if pos > STREAM_CHUNK_SIZE and pos > len(buffer) // 2:
+            buffer = buffer[pos:]
+            pos = 0
+
+def parse_relation(element):
+    """Boundary relation of an Overpass element as {id, tags, outer, inner}, with way geometries as (n, 2) lon/lat arrays"""
+    ways = {"outer": [], "inner": []}
+    for member in element.get("members", []):
+        role = member.get("role") or "outer"
+        geometry = member.get("geometry")
+        if member.get("type") != "way" or role not in ways or not geometry:
+            continue
+        # Nodes outside the query's bounding box come back as null
+        points = [point for point in geometry if point is not None]
+        coords = np.fromiter((value for point in points for value in (point["lon"], point["lat"])),
+                             dtype=np.float64, count=2 * len(points)).reshape(-1, 2)
+        if len(coords) >= 2:
+            ways[role].append(coords)
+    return {"id": element.get("id"), "tags": element.get("tags", {}), **ways}
+
+def assemble_rings(ways):
+    """Join way arrays that share endpoints into closed rings (linear time); unclosable chains are dropped"""
+    # Index the open ways by both endpoints
+    endpoints = {}
+    rings = []
+    for index, way in enumerate(ways):
+        if (way[0] == way[-1]).all():
+            rings.append(way)
+        else:
+            endpoints.setdefault(tuple(way[0]), []).append(index)
+            endpoints.setdefault(tuple(way[-1]), []).append(index)
+
+    used = set()
+    for index in sorted({i for indices in endpoints.values() for i in indices}):
+        if index in used:
+            continue
+        used.add(index)
+        parts = [ways[index]]
+        start, end = tuple(ways[index][0]), tuple(ways[index][-1])
+        while end != start:
+            following = next((i for i in endpoints.get(end, ()) if i not in used), None)
+            if following is None:
+                break
+            used.add(following)
+            way = ways[following]
+            if tuple(way[0]) != end:
+                way = way[::-1]
+            parts.append(way[1:])
+            end = tuple(way[-1])
+        if end == start:
+            rings.append(np.concatenate(parts))
+    # A ring needs at least three distinct points
+    return [ring for ring in rings if len(ring) >= 4]
+
+def relation_geometry(relation):
+    """GeoJSON Polygon/MultiPolygon of a parsed relation, with inner rings as holes (None without outer rings)"""
+    outers = assemble_rings(relation["outer"])
+    if not outers:
+        return None
+    inners = assemble_rings(relation["inner"])
+
+    # Each inner ring becomes a hole of the outer ring containing one of its interior points
+    holes = [[] for _ in outers]
+    if inners:
+        tree = shapely.STRtree([shapely.Polygon(ring) for ring in outers])
+        points = shapely.point_on_surface([shapely.Polygon(ring) for ring in inners])
+        inner_index, outer_index = tree.query(points, predicate="within")
+        for i, o in dict(zip(inner_index.tolist(), outer_index.tolist())).items():
+            holes[o].append(inners[i])
+
+    polygons = [[outer.tolist()] + [hole.tolist() for hole in polygon_holes]
+                for outer, polygon_holes in zip(outers, holes)]
+    if len(polygons) == 1:
+        return {"type": "Polygon", "coordinates": polygons[0]}
+    return {"type": "MultiPolygon", "coordinates": polygons}
+
+def overpass_query(query):
+    """Run an Overpass QL query on the shared session; returns the parsed boundary relations"""
+    with stage("fetch.overpass"):
+        response = request_with_retry("POST", OVERPASS_URL, data={"data": query}, stream=True)
+    with response:
+        response.raise_for_status()
+        # The body is downloaded and parsed in step, so this stage covers both
+        with stage("stream.overpass"):
+            return [parse_relation(element)
+                    for element in iter_overpass_elements(_counted(response.iter_content(STREAM_CHUNK_SIZE), "stream.overpass"))
+                    if element.get("type") == "relation"]
+
+def _counted(chunks, name):
+    """Pass byte chunks through, adding their size to stage `name`"""
+    for chunk in chunks:
+        record_bytes(name, len(chunk))
+        yield chunk
+
+def fetch_all_boundaries(fetch, jobs):
+    """Call fetch(*args) for every {state: args} job on a thread pool; returns {state: data} in job order"""
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = {state: pool.submit(fetch, *args) for state, args in jobs.items()}
+    return {state: future.result() for state, future in futures.items()}
+
+def relations_to_geojson(relations, state_name):
+    """Convert parsed boundary relations to a GeoJSON FeatureCollection (None if none has a geometry)"""
+    features = []
+    for relation in relations:
+        with stage("geometry.rings"):
+            geometry = relation_geometry(relation)
+        if geometry is not None:
+            features.append({
+                "type": "Feature",
+                "properties": {
+                    "name": state_name,
+                    "osm_id": relation["id"],
+                    "admin_level": relation["tags"].get("admin_level", "unknown")
+                },
+                "geometry": geometry
+            })
     
+    if features:
+        return {"type": "FeatureCollection", "features": features}
+    return None
+
+def fetch_boundary_data_osm_bulk(state_names):
+    """Fetch several regions with a single Overpass query.
+
+    state_names maps each state to its OSM name, as in state_mapping ("AU" for
+    Australia as a whole). All admin_level=4 relations inside Australia, plus
+    the AU relation if asked for, come back in one download and are split into
+    per-state FeatureCollections locally. States missing from the response are
+    left out of the returned {state: FeatureCollection}.
+    """
+    australia = ('relation["admin_level"="2"]["ISO3166-1"="AU"];'
+                 if "AU" in state_names.values() else "")
+    query = f"""
+    [out:json][timeout:180];
+    area["ISO3166-1"="AU"][admin_level=2]->.australia;
+    (
+      relation["admin_level"="4"]["boundary"="administrative"](area.australia);
+      {australia}
+    );
+    out geom;
+    """
+
+    try:
+        print(f"Fetching boundary data for {len(state_names)} regions from OpenStreetMap in one query...")
+        relations = overpass_query(query)
+    except Exception as e:
+        print(f"Error fetching OSM data in bulk: {str(e)}")
+        return {}
+
+    # Group the relations by OSM name; the country relation is keyed "AU"
+    by_name = {}
+    for relation in relations:
+        if relation["tags"].get("ISO3166-1") == "AU" and relation["tags"].get("admin_level") == "2":
+            name = "AU"
+        else:
+            name = relation["tags"].get("name")
+        by_name.setdefault(name, []).append(relation)
+
+    fetched = {}
+    for state, state_name in state_names.items():
+        data = relations_to_geojson(by_name.get(state_name, []), state_name)
+        if data is not None:
+            fetched[state] = data
+    return fetched
+
+def osm_state_query(state_name):
+    """Overpass QL query for a single region"""
     # Special case for Tasmania to get cleaner boundaries
     if state_name == "Tasmania":
         query = """
@@ -72,12 +502,15 @@ def fetch_boundary_data_osm(state_name, state_code):
         relation["name"="{state_name}"][boundary=administrative](area.australia);
         out geom;
         """
-    
+    return query
+
+def fetch_boundary_data_osm(state_name, state_code):
+    """Fetch Australian state boundary data using Overpass API"""
     try:
         print(f"Fetching boundary data for {state_name} from OpenStreetMap...")
-        result = api.query(query)
+        relations = overpass_query(osm_state_query(state_name))
         
-        if not result.relations:
+        if not relations:
             # Try alternative query if no results
             alt_query = f"""
             [out:json][timeout:180];
@@ -85,196 +518,469 @@ def fetch_boundary_data_osm(state_name, state_code):
             out geom;
             """
             print(f"No data found for {state_name}, trying alternative query...")
-            result = api.query(alt_query)
+            relations = overpass_query(alt_query)
             
-            if not result.relations:
+            if not relations:
                 print(f"Still no data found for {state_name}")
                 return None
         
-        # Process relation geometries to GeoJSON format
-        features = []
-        for relation in result.relations:
-            # Extract outer and inner ways for proper polygon representation
-            outer_ways = {}
-            inner_ways = {}
-            
-            # Group points by way ID to form the polygons
-            for member in relation.members:
-                if member.role == "outer" and hasattr(member, "geometry"):
-                    nodes = [[float(node.lon), float(node.lat)] for node in member.geometry]
-                    way_id = getattr(member, 'ref', f'outer_{len(outer_ways)}')
-                    outer_ways[way_id] = nodes
-                elif member.role == "inner" and hasattr(member, "geometry"):
-                    nodes = [[float(node.lon), float(node.lat)] for node in member.geometry]
-                    way_id = getattr(member, 'ref', f'inner_{len(inner_ways)}')
-                    inner_ways[way_id] = nodes
-            
-            # If we have outer ways, form a polygon or multipolygon
-            if outer_ways:
-                # For a simple case, just use all outer rings as a multipolygon
-                multi_polygon = []
-                for way_id, nodes in outer_ways.items():
-                    # Make sure the ring is closed
-                    if nodes[0] != nodes[-1] and len(nodes) > 1:
-                        nodes.append(nodes[0])
-                    # Only include valid rings
-                    if len(nodes) >= 4:
-                        multi_polygon.append([nodes])
-                
-                # Create the appropriate geometry type based on number of polygons
-                if len(multi_polygon) == 1:
-                    geometry = {
-                        "type": "Polygon",
-                        "coordinates": multi_polygon[0]
-                    }
-                else:
-                    geometry = {
-                        "type": "MultiPolygon", 
-                        "coordinates": multi_polygon
-                    }
-                
-                # Create the feature
-                features.append({
-                    "type": "Feature",
-                    "properties": {
-                        "name": state_name,
-                        "osm_id": relation.id,
-                        "admin_level": relation.tags.get("admin_level", "unknown")
-                    },
-                    "geometry": geometry
-                })
-        
-        if features:
-            return {"type": "FeatureCollection", "features": features}
-        else:
+        data = relations_to_geojson(relations, state_name)
+        if data is None:
             print(f"Failed to extract geometry for {state_name}")
-            return None
+        return data
             
     except Exception as e:
         print(f"Error fetching OSM data for {state_name}: {str(e)}")
         return None
 
-def draw_australia_with_boundaries(map_source="openstreetmap", load_from_local=False, show_legends=False, filename=None, display_map=True):
-    all_geometries = []
-    fetched_data = {}
-    
-    # Set default filename with map source suffix if not provided
-    if filename is None:
-        filename = f"AustraliaMap-{map_source}.png"
-    
-    # Ensure both the boundaries and output directories exist
-    os.makedirs("./boundaries", exist_ok=True)
-    os.makedirs("./output", exist_ok=True)
-    
-    # Prepend output directory to filename if it doesn't already include a path
-    if os.path.dirname(filename) == '':
-        filename = os.path.join("./output", filename)
-        
-    # Define the local cache file based on the map source
-    local_cache_file = f"./boundaries/fetched_map_data_{map_source}.json"
+# Per-region boundary cache: ./boundaries/<map_source>/<region>.json holds one
+# region's FeatureCollection, the time it was fetched and a hash of the request
+# that produced it. Entries younger than the TTL whose hash still matches are
+# used without network I/O; the others are re-fetched, and when a fetch fails
+# the last good entry is used instead.
+CACHE_DIR = "./boundaries"
+CACHE_TTL_DAYS = 30
+
+def region_cache_path(map_source, state):
+    """Cache file of one region"""
+    return os.path.join(CACHE_DIR, map_source, f"{state}.json")
+
+def request_hash(map_source, state):
+    """Hash of the request that fetches a region (without the API key)"""
+    if map_source == "geoapify":
+        request = re.sub(r"&?apiKey=[^&]*", "", urls[state])
+    else:
+        request = f"{osm_state_query(state_mapping[state])}\n{OSM_GEOMETRY_FORMAT}"
+    return hashlib.sha256(f"{map_source}\n{request}".encode()).hexdigest()[:16]
+
+def load_region_cache(map_source, state):
+    """Cached entry of a region, or None if there is no readable one"""
+    try:
+        with stage("cache.read_json"), open(region_cache_path(map_source, state), "r") as json_file:
+            return json.load(json_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def save_region_cache(map_source, state, data):
+    """Store a freshly fetched region, replacing the old entry atomically; returns the entry"""
+    path = region_cache_path(map_source, state)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    entry = {
+        "state": state,
+        "source": map_source,
+        "query_hash": request_hash(map_source, state),
+        "fetched_at": time.time(),
+        "data": data
+    }
+    with stage("cache.write_json"):
+        with open(path + ".tmp", "w") as json_file:
+            json.dump(entry, json_file)
+        os.replace(path + ".tmp", path)
+    return entry
+
+def fetch_regions(map_source, states, osm_query="bulk"):
+    """Fetch the given regions from the map source; returns {state: data or None}"""
+    if map_source == "geoapify":
+        # Fetch from Geoapify API, all regions at once
+        return fetch_all_boundaries(fetch_boundary_data_geoapify, {state: (urls[state],) for state in states})
+
+    # Fetch from OpenStreetMap using Overpass API, all regions at once
+    jobs = {state: (state_mapping[state], state) for state in states}
+    if osm_query != "bulk":
+        return fetch_all_boundaries(fetch_boundary_data_osm, jobs)
+
+    # One query for every region; any region it misses is fetched on its own
+    results = fetch_boundary_data_osm_bulk({state: args[0] for state, args in jobs.items()})
+    missing = {state: args for state, args in jobs.items() if state not in results}
+    if missing:
+        print(f"Not in the bulk response: {', '.join(missing)}; fetching them separately...")
+        results.update(fetch_all_boundaries(fetch_boundary_data_osm, missing))
+    return results
+
+def is_fresh(map_source, state, fetched_at, query_hash, cache_ttl_days):
+    """Whether a region fetched at fetched_at by the request hashed query_hash can be used as is"""
+    return (query_hash == request_hash(map_source, state)
+            and time.time() - (fetched_at or 0) < cache_ttl_days * 86400)
+
+def load_boundaries(map_source, states, load_from_local=False, cache_ttl_days=CACHE_TTL_DAYS, osm_query="bulk"):
+    """Return {state: cache entry} for the regions, fetching only stale or missing ones.
+
+    Each entry has the region's FeatureCollection under "data", with its
+    "fetched_at" time and "query_hash". With load_from_local every cached
+    entry is used regardless of its age and nothing is fetched.
+    """
+    boundaries = {}
+    entries = {state: load_region_cache(map_source, state) for state in states}
+    stale = []
+    for state in states:
+        entry = entries[state]
+        if entry is not None and (load_from_local or is_fresh(map_source, state, entry.get("fetched_at"),
+                                                               entry.get("query_hash"), cache_ttl_days)):
+            boundaries[state] = entry
+        elif not load_from_local:
+            stale.append(state)
+
+    # Regions cached before the per-region cache existed, in one file per source
+    legacy_file = os.path.join(CACHE_DIR, f"fetched_map_data_{map_source}.json")
+    if load_from_local and len(boundaries) < len(states) and os.path.exists(legacy_file):
+        with open(legacy_file, "r") as json_file:
+            legacy = json.load(json_file)
+        for state in states:
+            if state not in boundaries and legacy.get(state) and 'features' in legacy[state]:
+                boundaries[state] = {"data": legacy[state], "fetched_at": 0, "query_hash": None}
+
+    if stale:
+        print(f"Fetching {len(stale)} stale or missing regions: {', '.join(stale)}")
+        with stage("fetch"):
+            results = fetch_regions(map_source, stale, osm_query)
+        for state in stale:
+            data = results.get(state)
+            if data and 'features' in data:
+                boundaries[state] = save_region_cache(map_source, state, data)
+            elif entries[state] is not None:
+                fetched_at = time.strftime("%Y-%m-%d %H:%M", time.localtime(entries[state].get("fetched_at", 0)))
+                print(f"Fetching {state} failed; using the cached copy from {fetched_at}")
+                boundaries[state] = entries[state]
+            else:
+                print(f"Fetching {state} failed and there is no cached copy")
+
+    # Keep the regions in the requested order
+    return {state: boundaries[state] for state in states if state in boundaries}
+
+def region_geometries(state, data, map_source):
+    """Shapely geometries of one region's FeatureCollection"""
+    features = data['features']
+    if state == "Tasmania" and map_source != "openstreetmap":
+        # For Tasmania, only use the first feature to avoid overlapping boundaries
+        # (OpenStreetMap keeps only its primary feature, see add_region_properties)
+        features = features[:1]
+    with stage("geometry.shape"):
+        return [{'state': state, 'geometry': shape(feature['geometry'])} for feature in features]
 
-    if load_from_local:
-        # Load data from local storage
+# Derived columns stored with the geometries, computed once when regions are
+# ingested so that drawing does no per-feature geometry work
+REGION_PROPERTIES = ['area', 'label_x', 'label_y', 'minx', 'miny', 'maxx', 'maxy', 'primary']
+
+def add_region_properties(gdf):
+    """Add the area, label anchor (a point on the surface), bounding box and primary flag of every feature.
+
+    The primary feature of a region is its largest one; the region is labelled
+    there. Tasmania keeps only its primary feature, to avoid overlapping boundaries.
+    """
+    gdf = gdf.reset_index(drop=True)
+    geometries = gdf.geometry.values
+    labels = shapely.get_coordinates(shapely.point_on_surface(geometries), include_z=False)
+    empty = shapely.is_empty(geometries) | shapely.is_missing(geometries)
+    bounds = shapely.bounds(geometries)
+    gdf = gdf.assign(area=shapely.area(geometries), label_x=np.nan, label_y=np.nan,
+                     minx=bounds[:, 0], miny=bounds[:, 1], maxx=bounds[:, 2], maxy=bounds[:, 3])
+    # point_on_surface gives no coordinates for empty geometries
+    gdf.loc[~empty, ['label_x', 'label_y']] = labels
+    gdf['primary'] = gdf.index.isin(gdf[~empty].groupby('state')['area'].idxmax())
+    return gdf[(gdf['state'] != 'Tasmania') | gdf['primary']].reset_index(drop=True)
+
+# Binary geometry cache: ./boundaries/<map_source>/regions.parquet keeps the
+# processed geometries of every cached region as GeoParquet (WKB geometry
+# column), with each region's fetch time and request hash. pyarrow reads it
+# memory-mapped and decodes the WKB in bulk, so a warm run builds its
+# GeoDataFrame without parsing GeoJSON or calling shape() per feature; the
+# JSON entries are only read for regions missing from it or out of date.
+# Without pyarrow this cache is skipped.
+GEOMETRY_CACHE = "regions.parquet"
+
+def load_boundary_frame(map_source, states, load_from_local=False, cache_ttl_days=CACHE_TTL_DAYS, osm_query="bulk"):
+    """GeoDataFrame (state, geometry, fetched_at, query_hash and REGION_PROPERTIES) of the regions, in the order of states"""
+    path = os.path.join(CACHE_DIR, map_source, GEOMETRY_CACHE)
+    cached = None
+    upgraded = False
+    frames = []
+    remaining = list(states)
+    if pyarrow is not None and os.path.exists(path):
         try:
-            with open(local_cache_file, "r") as json_file:
-                fetched_data = json.load(json_file)
-                for state, data in fetched_data.items():
-                    if data and 'features' in data:
-                        # For Tasmania, only use the first feature to avoid overlapping boundaries
-                        if state == "Tasmania" and len(data['features']) > 0:
-                            feature = data['features'][0]
-                            geometry = shape(feature['geometry'])
-                            all_geometries.append({
-                                'state': state,
-                                'geometry': geometry
-                            })
-                        else:
-                            for feature in data['features']:
-                                geometry = shape(feature['geometry'])
-                                all_geometries.append({
-                                    'state': state,
-                                    'geometry': geometry
-                                })
-        except FileNotFoundError:
-            print(f"Local map data not found at {local_cache_file}. Please fetch data first.")
-            return
+            with stage("cache.read_parquet"):
+                cached = gpd.read_parquet(path, memory_map=True)
+        except Exception as e:
+            print(f"Could not read the geometry cache {path}: {e}")
+        else:
+            usable = []
+            for state in states:
+                rows = cached[cached['state'] == state]
+                if not rows.empty and (load_from_local or is_fresh(map_source, state, rows['fetched_at'].iloc[0],
+                                                                   rows['query_hash'].iloc[0], cache_ttl_days)):
+                    usable.append(state)
+            if not set(REGION_PROPERTIES) <= set(cached.columns):
+                # Written before the derived columns were stored
+                cached = add_region_properties(cached)
+                upgraded = True
+            frames.append(cached[cached['state'].isin(usable)])
+            remaining = [state for state in states if state not in usable]
+
+    rebuilt = []
+    if remaining:
+        for state, entry in load_boundaries(map_source, remaining, load_from_local, cache_ttl_days, osm_query).items():
+            for row in region_geometries(state, entry["data"], map_source):
+                row.update(fetched_at=entry.get("fetched_at"), query_hash=entry.get("query_hash"))
+                rebuilt.append(row)
+    if rebuilt:
+        with stage("geometry.frame"):
+            frames.append(add_region_properties(gpd.GeoDataFrame(rebuilt, geometry='geometry', crs="EPSG:4326")))
+
+    if not frames:
+        return gpd.GeoDataFrame(columns=['state', 'geometry', 'fetched_at', 'query_hash'] + REGION_PROPERTIES,
+                                geometry='geometry', crs="EPSG:4326")
+    gdf = gpd.GeoDataFrame(pd.concat(frames, ignore_index=True), geometry='geometry', crs="EPSG:4326")
+    gdf = gdf.iloc[gdf['state'].map({state: i for i, state in enumerate(states)}).argsort(kind='stable')].reset_index(drop=True)
+
+    if (rebuilt or upgraded) and pyarrow is not None:
+        # Keep the cached regions that were not drawn this time (such as Australia)
+        if cached is not None:
+            kept = cached[~cached['state'].isin(gdf['state'])]
+            stored = gpd.GeoDataFrame(pd.concat([kept, gdf], ignore_index=True), geometry='geometry', crs="EPSG:4326")
+        else:
+            stored = gdf
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with stage("cache.write_parquet"):
+            stored.to_parquet(path + ".tmp")
+            os.replace(path + ".tmp", path)
+    return gdf
+
+# Level-of-detail cache: maps are drawn at FIGSIZE inches and OUTPUT_DPI, so
+# boundary detail finer than half an output pixel never shows. The tolerance is
+# derived from the extent being drawn, and the states are simplified together
+# as one polygonal coverage, so a border shared by two states is simplified
+# once and stays identical on both sides (no slivers or gaps). Each level of
+# detail is kept in ./boundaries/<map_source>/lod-<tolerance>.parquet, tagged
+# with the fetch time and request hash of the regions it was built from.
+FIGSIZE = (12, 10)
+OUTPUT_DPI = 300
+LOD_PIXELS = 0.5  # Simplification tolerance in output pixels
+LOD_KEY = ['state', 'fetched_at', 'query_hash', 'feature', 'features']  # A region's features keep their order
+
+def lod_tolerance(bounds, figsize=FIGSIZE, dpi=OUTPUT_DPI):
+    """Simplification tolerance in degrees for drawing the extent (minx, miny, maxx, maxy) at figsize inches and dpi"""
+    minx, miny, maxx, maxy = bounds
+    # The axes never fill the whole figure, so a real pixel is at least this large
+    return LOD_PIXELS * max((maxx - minx) / (figsize[0] * dpi), (maxy - miny) / (figsize[1] * dpi))
+
+def _lod_keys(gdf):
+    """LOD cache key of every row: its region's fetch, the feature's place in it and the region's feature count"""
+    fetch = gdf.groupby(LOD_KEY[:3], sort=False, dropna=False)
+    return gdf[LOD_KEY[:3]].assign(feature=fetch.cumcount().to_numpy(), features=fetch['state'].transform('size').to_numpy())
+
+def simplify_boundaries(gdf, map_source, figsize=FIGSIZE, dpi=OUTPUT_DPI):
+    """Boundaries of gdf simplified for drawing at figsize inches and dpi, read from or stored in the LOD cache"""
+    if gdf.empty:
+        return gdf
+    # The tolerance follows the extent of the states, so maps with and without
+    # Australia (which only adds islands around the edges) share one level of detail
+    states = gdf[gdf['state'] != 'Australia']
+    if states.empty:
+        states = gdf
+    bounds = (states['minx'].min(), states['miny'].min(), states['maxx'].max(), states['maxy'].max())
+    tolerance = lod_tolerance(bounds, figsize, dpi)
+    path = os.path.join(CACHE_DIR, map_source, f"lod-{tolerance:.3g}.parquet")
+
+    cached = None
+    if pyarrow is not None and os.path.exists(path):
+        try:
+            with stage("lod.read"):
+                cached = gpd.read_parquet(path, memory_map=True)
+            # Any cached set of rows that covers gdf will do, matched feature by feature
+            rows = _lod_keys(gdf).merge(_lod_keys(cached).reset_index(drop=True).reset_index(), on=LOD_KEY, how='left')['index']
+            if len(rows) == len(gdf) and rows.notna().all() and set(REGION_PROPERTIES) <= set(cached.columns):
+                return cached.iloc[rows.astype(int)].reset_index(drop=True)
+        except Exception as e:
+            print(f"Could not read the LOD cache {path}: {e}")
+            cached = None
+
+    with stage("lod.simplify"):
+        geometries = gdf.geometry.values.copy()
+        # The states tile the country, so they are simplified as one coverage; Australia
+        # overlaps all of them and anything that is not polygonal is simplified on its own
+        coverage = (gdf['state'] != 'Australia').to_numpy() & gdf.geom_type.isin(['Polygon', 'MultiPolygon']).to_numpy()
+        coverage_simplify = hasattr(shapely, "coverage_simplify")
+        if coverage_simplify:
+            if coverage.any():
+                geometries[coverage] = shapely.coverage_simplify(geometries[coverage], tolerance)
+        else:
+            # Shapely < 2.1: shared borders are simplified separately on each side
+            # and may open gaps, so the result is drawn but not cached
+            print(f"Shapely {shapely.__version__} has no coverage_simplify (needs 2.1); "
+                  "state borders may show gaps and the level of detail is not cached")
+            coverage[:] = False
+        geometries[~coverage] = shapely.simplify(geometries[~coverage], tolerance, preserve_topology=True)
+        simplified = gdf.set_geometry(geometries)
+
+    if pyarrow is not None and coverage_simplify:
+        stored = simplified
+        if cached is not None:
+            # Keep the cached regions that were not drawn this time (such as Australia)
+            kept = cached[~cached['state'].isin(simplified['state'])]
+            stored = gpd.GeoDataFrame(pd.concat([kept, simplified], ignore_index=True), geometry='geometry', crs=simplified.crs)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with stage("lod.write"):
+            stored.to_parquet(path + ".tmp")
+            os.replace(path + ".tmp", path)
+    return simplified
+
+# Offline point-in-region lookup, the local counterpart of Geoapify's part-of
+# endpoint: an STRtree over every feature of the full-resolution cached
+# boundaries (prepared, so point-in-polygon tests are indexed too) answers whole
+# batches of lon/lat points with one vectorized query, with no network access.
+# The features come from the JSON cache, since the GeoParquet cache only keeps
+# the ones that are drawn.
+LOOKUP_CHUNK_SIZE = 500_000  # Points per batch when streaming a CSV or Parquet file
+LON_COLUMNS = ("lon", "lng", "longitude", "x")
+LAT_COLUMNS = ("lat", "latitude", "y")
+
+def build_region_index(map_source="openstreetmap", regions=None):
+    """Spatial index of every cached feature of the regions (the states by default) for lookup_regions.
+
+    The regions are read as --load-local reads them, the legacy cache file
+    included, and keep all their features: the maps draw only Tasmania's main
+    island, but points on the others still belong to Tasmania.
+    """
+    if regions is None:
+        regions = [state for state in state_mapping if state != "Australia"]
+    states = []
+    geometries = []
+    for state, entry in load_boundaries(map_source, regions, load_from_local=True).items():
+        with stage("geometry.shape"):
+            for feature in entry["data"]["features"]:
+                if feature.get("geometry"):
+                    states.append(state)
+                    geometries.append(shape(feature["geometry"]))
+    if not geometries:
+        raise ValueError(f"No cached boundaries in {os.path.join(CACHE_DIR, map_source)}. Please fetch data first.")
+    with stage("lookup.index"):
+        geometries = np.array(geometries, dtype=object)
+        shapely.prepare(geometries)
+        tree = shapely.STRtree(geometries)
+    return {"tree": tree, "geometries": geometries, "states": np.array(states, dtype=object)}
+
+def lookup_regions(index, lon, lat):
+    """Region of every lon/lat point as an object array, None for points outside every region.
+
+    A point on a border shared by two regions gets the one that comes first in the index.
+    """
+    with stage("lookup.query"):
+        points = shapely.points(np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64))
+        # The tree only narrows the candidates down by bounding box: a predicate passed
+        # to query() would prepare the points, while testing the prepared regions is far faster
+        point_index, geometry_index = index["tree"].query(points)
+        inside = shapely.intersects(index["geometries"][geometry_index], points[point_index])
+        point_index, geometry_index = point_index[inside], geometry_index[inside]
+        regions = np.full(len(points), None, dtype=object)
+        # Assign the matches from the last region to the first, so the first one wins
+        order = np.argsort(-geometry_index, kind="stable")
+        regions[point_index[order]] = index["states"][geometry_index[order]]
+        return regions
+
+def _coordinate_column(columns, names):
+    """The column of a points file whose name is one of names (case-insensitive)"""
+    for column in columns:
+        if str(column).lower() in names:
+            return column
+    raise ValueError(f"No coordinate column found; expected one of {', '.join(names)}")
+
+def iter_point_batches(path, chunk_size=LOOKUP_CHUNK_SIZE):
+    """Stream a CSV or Parquet file of points as DataFrames of at most chunk_size rows"""
+    if path.lower().endswith((".parquet", ".pq")):
+        if pyarrow is None:
+            raise ValueError("Reading Parquet points needs pyarrow")
+        for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
     else:
-        # Fetch and process data based on the selected map source
-        if map_source.lower() == "geoapify":
-            # Fetch from Geoapify API
-            for state, url in urls.items():
-                data = fetch_boundary_data_geoapify(url)
-                if data and 'features' in data:
-                    fetched_data[state] = data
-                    
-                    if state == "Tasmania" and len(data['features']) > 0:
-                        feature = data['features'][0]
-                        geometry = shape(feature['geometry'])
-                        all_geometries.append({
-                            'state': state,
-                            'geometry': geometry
-                        })
-                    else:
-                        for feature in data['features']:
-                            geometry = shape(feature['geometry'])
-                            all_geometries.append({
-                                'state': state,
-                                'geometry': geometry
-                            })
-        else:  # openstreetmap
-            # Fetch from OpenStreetMap using Overpass API
-            for state, full_name in state_mapping.items():
-                # Skip Australia if it's not in the list (check against keys in urls)
-                if state == "Australia" and state not in urls:
-                    continue
-                
-                data = fetch_boundary_data_osm(full_name, state)
-                if data and 'features' in data:
-                    fetched_data[state] = data
-                    
-                    if state == "Tasmania":
-                        # For Tasmania, only use the largest feature to avoid overlapping boundaries
-                        largest_area = 0
-                        largest_feature = None
-                        
-                        for feature in data['features']:
-                            geom = shape(feature['geometry'])
-                            try:
-                                area = geom.area
-                                if area > largest_area:
-                                    largest_area = area
-                                    largest_feature = feature
-                            except Exception as e:
-                                print(f"Could not process geometry for {state}: {e}")
-                        
-                        if largest_feature:
-                            all_geometries.append({
-                                'state': state,
-                                'geometry': shape(largest_feature['geometry'])
-                            })
-                    else:
-                        # Process other states normally
-                        for feature in data['features']:
-                            geometry = shape(feature['geometry'])
-                            all_geometries.append({
-                                'state': state,
-                                'geometry': geometry
-                            })
-
-        # Save fetched data to local storage in JSON format
-        with open(local_cache_file, "w") as json_file:
-            json.dump(fetched_data, json_file)
-
-    if not all_geometries:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+def lookup_file(index, path, output=None, chunk_size=LOOKUP_CHUNK_SIZE):
+    """Add a "region" column to the points in a CSV or Parquet file, batch by batch.
+
+    The result goes to output (CSV, or Parquet if it ends in .parquet), or to
+    standard output as CSV. Returns the number of points looked up.
+    """
+    writer = None
+    count = 0
+    try:
+        for batch in iter_point_batches(path, chunk_size):
+            lon = _coordinate_column(batch.columns, LON_COLUMNS)
+            lat = _coordinate_column(batch.columns, LAT_COLUMNS)
+            batch["region"] = lookup_regions(index, batch[lon].to_numpy(), batch[lat].to_numpy())
+            if output is not None and output.lower().endswith((".parquet", ".pq")):
+                table = pyarrow.Table.from_pandas(batch, preserve_index=False)
+                if writer is None:
+                    writer = pyarrow.parquet.ParquetWriter(output, table.schema)
+                writer.write_table(table)
+            else:
+                batch.to_csv(output if output is not None else sys.stdout, mode="a" if count else "w",
+                             header=count == 0, index=False)
+            count += len(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+def prepare_boundaries(map_source, states, load_from_local=False, cache_ttl_days=CACHE_TTL_DAYS, osm_query="bulk"):
+    """Load the regions and simplify them for drawing; returns None if there is nothing to draw"""
+    # GeoDataFrame in WGS84 (EPSG:4326) for plotting in latitude and longitude
+    gdf = load_boundary_frame(map_source, states, load_from_local, cache_ttl_days, osm_query)
+    if load_from_local and gdf.empty:
+        print(f"Local map data not found in {os.path.join(CACHE_DIR, map_source)}. Please fetch data first.")
+        return None
+
+    if gdf.empty:
         print("No geometries to plot. Check if data was fetched correctly.")
-        return
-            
-    # Create GeoDataFrame
-    gdf = gpd.GeoDataFrame(all_geometries)
+        return None
 
-    # Transform data to WGS84 (EPSG:4326) for plotting in latitude and longitude
-    gdf = gdf.set_crs(epsg=4326)
-    
+    # Drop the detail that would be finer than the output resolution
+    return simplify_boundaries(gdf, map_source)
+
+# Files written per map by render_map: {output: (file name suffix, dpi)}; an
+# SVG is vector, so its dpi only matters for embedded images
+RENDER_OUTPUTS = {
+    "png": (".png", OUTPUT_DPI),
+    "thumb": ("-thumb.png", 30),  # 360x300 pixels
+    "svg": (".svg", OUTPUT_DPI),
+}
+RENDERERS = ["geopandas", "fast"]
+
+def geometry_path(geometry):
+    """Matplotlib Path of a Polygon or MultiPolygon, holes included (None for anything else)"""
+    if geometry is None or geometry.is_empty or geometry.geom_type not in ("Polygon", "MultiPolygon"):
+        return None
+    vertices = []
+    codes = []
+    for polygon in getattr(geometry, "geoms", [geometry]):
+        # Counter-clockwise shells and clockwise holes, so the holes stay empty when filled
+        polygon = orient(polygon)
+        for ring in [polygon.exterior, *polygon.interiors]:
+            coords = np.asarray(ring.coords)[:, :2]
+            ring_codes = np.full(len(coords), Path.LINETO, dtype=Path.code_type)
+            ring_codes[0] = Path.MOVETO
+            ring_codes[-1] = Path.CLOSEPOLY
+            vertices.append(coords)
+            codes.append(ring_codes)
+    return Path(np.concatenate(vertices), np.concatenate(codes))
+
+def output_files(filename, outputs):
+    """[(path, dpi)] of the outputs of a map, named after its .png filename"""
+    base = filename[:-len(".png")] if filename.lower().endswith(".png") else filename
+    return [(base + RENDER_OUTPUTS[output][0], RENDER_OUTPUTS[output][1]) for output in outputs]
+
+def render_map(gdf, regions, map_source, show_legends, filename, display_map=False, renderer="geopandas", outputs=("png",)):
+    """Draw the regions of gdf, labelled at their primary features, and save the map; returns the files written.
+
+    regions is the full list of region names; it fixes the colour map, so every
+    variant drawn from the same data gets the same colours. Without display_map
+    the map is drawn on an off-screen Figure, which does not depend on the
+    pyplot backend and is safe to use in worker processes. outputs are keys of
+    RENDER_OUTPUTS, all saved from the one drawn figure.
+
+    The "geopandas" renderer plots each region through GeoDataFrame.plot. The
+    "fast" renderer draws every region as one PathCollection with the colours,
+    draw order and aspect geopandas would use, so both give the same image;
+    either way the saved files are trimmed to the drawing.
+    """
     # Define a distinct color map for Australian states
     # Use a more distinct color palette than tab10
     state_colors = {
@@ -290,101 +996,147 @@ def draw_australia_with_boundaries(map_source="openstreetmap", load_from_local=F
     }
     
     # Create a categorical color map
-    from matplotlib.colors import ListedColormap
-    import pandas as pd  # Add pandas import for concat
-    states = list(state_mapping.keys())
-    colors = [state_colors.get(state, '#CCCCCC') for state in states]
+    colors = [state_colors.get(state, '#CCCCCC') for state in regions]
     custom_cmap = ListedColormap(colors)
     
-    # Plot the map with state boundaries
-    fig, ax = plt.subplots(1, 1, figsize=(12, 10))
-    
-    # Update Tasmania plotting approach
-    tasmania_gdf = gdf[gdf['state'] == 'Tasmania']
-    main_gdf = gdf[gdf['state'] != 'Tasmania']
+    with stage("render.plot"):
+        # Plot the map with state boundaries
+        if display_map:
+            fig, ax = plt.subplots(1, 1, figsize=FIGSIZE)
+        else:
+            fig = Figure(figsize=FIGSIZE)
+            ax = fig.subplots(1, 1)
     
-    # Plot main continent
-    main_plot = main_gdf.plot(column='state', ax=ax, categorical=True, legend=show_legends, 
-                      edgecolor='black', linewidth=0.5, cmap=custom_cmap)
+        # Update Tasmania plotting approach
+        is_tasmania = (gdf['state'] == 'Tasmania').to_numpy()
+        tasmania_gdf = gdf[is_tasmania]
+        main_gdf = gdf[~is_tasmania]
     
-    # Plot Tasmania with thicker edges and solid fill
-    if not tasmania_gdf.empty:
-        tasmania_gdf.plot(ax=ax, color=state_colors['Tasmania'], 
-                       edgecolor='black', linewidth=1.5)
+        if renderer == "fast":
+            # The colours geopandas gives a categorical column: the i-th colour for the i-th name in sorted order
+            names = sorted(set(main_gdf['state']))
+            facecolors = {name: custom_cmap(i) for i, name in enumerate(names)}
+            facecolors['Tasmania'] = state_colors['Tasmania']
+            paths = [geometry_path(geometry) for geometry in gdf.geometry]
+            # Drawn in geopandas' order: the regions by name, then Tasmania on top
+            order = np.lexsort((gdf['state'].to_numpy(dtype=str), is_tasmania))
+            drawn = [i for i in order if paths[i] is not None]
+            states = gdf['state'].to_numpy()[drawn]
+            collection = PathCollection([paths[i] for i in drawn],
+                                        facecolors=[facecolors[state] for state in states],
+                                        edgecolors='black',
+                                        linewidths=np.where(states == 'Tasmania', 1.5, 0.5))
+            ax.add_collection(collection, autolim=True)
+            ax.autoscale_view()
+            # The longitude/latitude aspect geopandas sets, from the bounds of the
+            # last frame it plots (Tasmania, when it is drawn)
+            last = tasmania_gdf if not tasmania_gdf.empty else main_gdf
+            _, miny, _, maxy = last.total_bounds
+            ax.set_aspect(1 / np.cos(np.radians((miny + maxy) / 2)))
+            if show_legends:
+                ax.legend(handles=[Patch(facecolor=facecolors[name], edgecolor='black', linewidth=0.5, label=name)
+                                   for name in names])
+        else:
+            # Plot main continent
+            main_gdf.plot(column='state', ax=ax, categorical=True, legend=show_legends, 
+                          edgecolor='black', linewidth=0.5, cmap=custom_cmap)
+        
+            # Plot Tasmania with thicker edges and solid fill
+            if not tasmania_gdf.empty:
+                tasmania_gdf.plot(ax=ax, color=state_colors['Tasmania'], 
+                               edgecolor='black', linewidth=1.5)
     
-    plt.title(f"Australia Map with State Boundaries ({map_source.capitalize()} data)")
-    plt.xlabel("Longitude")
-    plt.ylabel("Latitude")
+        ax.set_title(f"Australia Map with State Boundaries ({map_source.capitalize()} data)")
+        # The size GeoDataFrame.plot gives its own axis labels, set for both renderers
+        ax.set_xlabel("Longitude", fontsize="small")
+        ax.set_ylabel("Latitude", fontsize="small")
     
-    # Add state labels for clarity
-    for state in states:
-        state_gdf = gdf[gdf['state'] == state]
-        if not state_gdf.empty:
-            try:
-                # Try to get a representative point safely
-                for idx, row in state_gdf.iterrows():
-                    geom = row.geometry
-                    if geom and not geom.is_empty:
-                        try:
-                            # Use representative_point() which is safer than centroid
-                            point = geom.representative_point()
-                            ax.text(point.x, point.y, state, fontsize=8, ha='center', va='center')
-                            # Only label once per state
-                            break
-                        except:
-                            # If that fails, try centroid
-                            try:
-                                point = geom.centroid
-                                ax.text(point.x, point.y, state, fontsize=8, ha='center', va='center')
-                                break
-                            except:
-                                continue
-            except Exception as e:
-                print(f"Could not place label for {state}: {e}")
-
-    # Save the map as a PNG file with higher resolution
-    plt.savefig(filename, dpi=300, bbox_inches='tight')
+        # Add state labels for clarity, one per region at the precomputed anchor of its primary feature
+        labels = gdf[gdf['primary'].to_numpy() & gdf['label_x'].notna().to_numpy()]
+        for state, x, y in zip(labels['state'], labels['label_x'], labels['label_y']):
+            ax.text(x, y, state, fontsize=8, ha='center', va='center')
+
+    # Save every output from the same figure
+    files = output_files(filename, outputs)
+    for path, dpi in files:
+        with stage("render.savefig"):
+            fig.savefig(path, dpi=dpi, bbox_inches='tight')
     
     # Only show the map if display_map is True
     if display_map:
         plt.show()
-    else:
-        plt.close()
+    return [path for path, dpi in files]
 
-def gen_all_maps(map_source="openstreetmap", load_from_local=False):
-    """Generate all variants of Australia maps and save them to disk"""
-    print(f"Generating all map variants using {map_source} data...")
-    
-    # Generate map with no islands, no legends
-    print("Generating map without islands, without legends...")
-    global urls
-    
-    # Save the original URLs
-    original_urls = urls.copy()
-    
-    # Without islands (exclude Australia)
-    if "Australia" in urls:
-        urls.pop("Australia", None)
-    draw_australia_with_boundaries(map_source=map_source, load_from_local=load_from_local, show_legends=False, 
-                                  filename=f"./output/AustraliaMap-no-Islands-no-Legends-{map_source}.png", display_map=False)
-    
-    # Without islands, with legends
-    print("Generating map without islands, with legends...")
-    draw_australia_with_boundaries(map_source=map_source, load_from_local=load_from_local, show_legends=True, 
-                                  filename=f"./output/AustraliaMap-no-Islands-with-Legends-{map_source}.png", display_map=False)
-    
-    # Restore original URLs
-    urls = original_urls.copy()
+def output_path(filename):
+    """Path of a map file, in ./output unless filename already includes a directory"""
+    # Ensure both the boundaries and output directories exist
+    os.makedirs("./boundaries", exist_ok=True)
+    os.makedirs("./output", exist_ok=True)
     
-    # With islands, no legends
-    print("Generating map with islands, without legends...")
-    draw_australia_with_boundaries(map_source=map_source, load_from_local=load_from_local, show_legends=False, 
-                                  filename=f"./output/AustraliaMap-with-Islands-no-Legends-{map_source}.png", display_map=False)
+    # Prepend output directory to filename if it doesn't already include a path
+    if os.path.dirname(filename) == '':
+        filename = os.path.join("./output", filename)
+    return filename
+
+def draw_australia_with_boundaries(map_source="openstreetmap", load_from_local=False, show_legends=False, filename=None, display_map=True, osm_query="bulk",
+                                   cache_ttl_days=CACHE_TTL_DAYS, renderer="geopandas", outputs=("png",)):
     
-    # With islands, with legends
-    print("Generating map with islands, with legends...")
-    draw_australia_with_boundaries(map_source=map_source, load_from_local=load_from_local, show_legends=True, 
-                                  filename=f"./output/AustraliaMap-with-Islands-with-Legends-{map_source}.png", display_map=False)
+    # Set default filename with map source suffix if not provided
+    if filename is None:
+        filename = f"AustraliaMap-{map_source}.png"
+    filename = output_path(filename)
+        
+    # Regions to draw (skipping Australia if it's not in the list, checked against keys in urls)
+    if map_source.lower() == "geoapify":
+        states = list(urls)
+    else:
+        states = [state for state in state_mapping if state != "Australia" or state in urls]
+
+    gdf = prepare_boundaries(map_source, states, load_from_local, cache_ttl_days, osm_query)
+    if gdf is None:
+        return
+    render_map(gdf, list(state_mapping), map_source, show_legends, filename, display_map, renderer, outputs)
+
+# Map variants written by gen_all_maps: (include Australia, show legends, file name)
+MAP_VARIANTS = [
+    (False, False, "AustraliaMap-no-Islands-no-Legends-{}.png"),
+    (False, True, "AustraliaMap-no-Islands-with-Legends-{}.png"),
+    (True, False, "AustraliaMap-with-Islands-no-Legends-{}.png"),
+    (True, True, "AustraliaMap-with-Islands-with-Legends-{}.png"),
+]
+RENDER_WORKERS = min(len(MAP_VARIANTS), os.cpu_count() or 1)
+
+def gen_all_maps(map_source="openstreetmap", load_from_local=False, osm_query="bulk", cache_ttl_days=CACHE_TTL_DAYS,
+                 workers=RENDER_WORKERS, renderer="geopandas", outputs=("png",)):
+    """Generate all variants of Australia maps and save them to disk.
+
+    The regions, Australia included, are loaded and simplified once; each
+    variant is a filter of that data. The variants are rendered in parallel by
+    `workers` processes (in this process if workers is 1). A --profile times
+    the worker renders together as the render.workers stage; with one worker
+    they get the full render.plot/render.savefig breakdown.
+    """
+    print(f"Generating all map variants using {map_source} data...")
+    states = list(urls) if map_source.lower() == "geoapify" else list(state_mapping)
+    gdf = prepare_boundaries(map_source, states, load_from_local, cache_ttl_days, osm_query)
+    if gdf is None:
+        return
+
+    jobs = []
+    for include_australia, show_legends, filename in MAP_VARIANTS:
+        variant = gdf if include_australia else gdf[gdf['state'] != 'Australia']
+        print(f"Generating map {'with' if include_australia else 'without'} islands, "
+              f"{'with' if show_legends else 'without'} legends...")
+        jobs.append((variant, list(state_mapping), map_source, show_legends,
+                     output_path(filename.format(map_source)), False, renderer, outputs))
+
+    if workers > 1:
+        # Workers do not trace memory, even when forked from a profiled process
+        with stage("render.workers"), ProcessPoolExecutor(max_workers=workers, initializer=tracemalloc.stop) as pool:
+            list(pool.map(render_map, *zip(*jobs)))
+    else:
+        for job in jobs:
+            render_map(*job)
     
     print(f"All map variants using {map_source} data have been generated and saved to disk.")
 
@@ -400,6 +1152,7 @@ Examples:
   python Australia-State-Map.py --add-map-legends=y            # Show legends on the map
   python Australia-State-Map.py --load-local                   # Load cached data from local storage
   python Australia-State-Map.py --gen-all                      # Generate all map variants and save to disk
+  python Australia-State-Map.py --lookup=points.csv            # Find the region of every lon/lat point offline
 """
     )
     
@@ -431,12 +1184,61 @@ Examples:
                            "y/Y/Yes: show legends\n"
                            "n/N/No: hide legends (default)")
 
+    parser.add_argument("--cache-ttl",
+                      type=float,
+                      default=CACHE_TTL_DAYS,
+                      help=f"Re-fetch cached regions older than this many days (default: {CACHE_TTL_DAYS}, 0 re-fetches everything)")
+
+    parser.add_argument("--osm-query",
+                      type=str,
+                      choices=['bulk', 'per-state'],
+                      default='bulk',
+                      help="How to query OpenStreetMap:\n"
+                           "bulk: one Overpass query for all regions (default)\n"
+                           "per-state: one query per region")
+
     parser.add_argument("--gen-all", 
                       action="store_true", 
                       help="Generate all map variants (with/without islands, with/without legends) and save to disk.")
 
+    parser.add_argument("--renderer",
+                      type=str,
+                      choices=RENDERERS,
+                      default='geopandas',
+                      help="How maps are drawn:\n"
+                           "geopandas: GeoDataFrame.plot, files trimmed to the drawing (default)\n"
+                           "fast: one PathCollection with a fixed layout, each file rendered once")
+
+    parser.add_argument("--outputs",
+                      type=lambda value: [output.strip() for output in value.split(",")],
+                      default=["png"],
+                      help=f"Comma-separated files to write per map, all from one drawn figure\n"
+                           f"({', '.join(RENDER_OUTPUTS)}; default: png)")
+
+    parser.add_argument("--lookup",
+                      type=str,
+                      metavar="POINTS",
+                      help="Look up the region of every point in a CSV or Parquet file with lon/lat columns,\n"
+                           "using the cached boundaries only (no network access)")
+
+    parser.add_argument("--lookup-output",
+                      type=str,
+                      metavar="FILE",
+                      help="Where --lookup writes the points with their region (CSV or .parquet, default: standard output)")
+
+    parser.add_argument("--profile",
+                      type=str,
+                      metavar="REPORT",
+                      help="Write a JSON report with the wall time, bytes transferred and peak memory\n"
+                           "of every pipeline stage (fetch, parse, cache, geometry, render) to REPORT")
+
     # Parse arguments
     args = parser.parse_args()
+    if args.profile:
+        start_profile()
+    unknown = [output for output in args.outputs if output not in RENDER_OUTPUTS]
+    if unknown:
+        parser.error(f"unknown --outputs: {', '.join(unknown)} (choose from {', '.join(RENDER_OUTPUTS)})")
 
     # Get map data source
     map_source = args.map_source.lower()
@@ -447,42 +1249,35 @@ Examples:
     # Determine whether to display map legends
     show_legends = args.add_map_legends.lower() in ['y', 'yes']
 
-    # Define URLs for Australia and its states (for Geoapify)
-    urls = {
-        "Australia": f"https://api.geoapify.com/v1/boundaries/consists-of?id=51176098d366ab60405902e9a0cc06b73ac0f00101f901743a010000000000c0020b9203094175737472616c6961&geometry=geometry_5000&apiKey={API_KEY}",
-        "NSW": f"https://api.geoapify.com/v1/boundaries/consists-of?id=51e99499555f52624059f2cb54feeb6a40c0f00101f901315923000000000092030f4e657720536f7574682057616c6573&geometry=geometry_5000&apiKey={API_KEY}",
-        "Victoria": f"https://api.geoapify.com/v1/boundaries/consists-of?id=51f0deebf5c1126240594479736c984b42c0f00101f901c559230000000000920308566963746f726961&geometry=geometry_5000&apiKey={API_KEY}",
-        "Queensland": f"https://api.geoapify.com/v1/boundaries/consists-of?id=51f15c2cf5bbd8614059085d56072f7033c0f00101f901335923000000000092030a517565656e736c616e64&geometry=geometry_5000&apiKey={API_KEY}",
-        "South Australia": f"https://api.geoapify.com/v1/boundaries/consists-of?id=51787ed8a0e911614059132c299cee0640c0f00101f901345923000000000092030f536f757468204175737472616c6961&geometry=geometry_5000&apiKey={API_KEY}",
-        "Western Australia": f"https://api.geoapify.com/v1/boundaries/consists-of?id=5142b2fa1f224b5e4059678d1dc2f86138c0f00101f90136592300000000009203115765726e204175737472616c6961&geometry=geometry_5000&apiKey={API_KEY}",
-        "Tasmania": f"https://api.geoapify.com/v1/boundaries/consists-of?id=51910a5391fc58624059624c72f14b0745c0f00101f90174282400000000009203085461736d616e6961&geometry=geometry_5000&apiKey={API_KEY}",
-        "Northern Territory": f"https://api.geoapify.com/v1/boundaries/consists-of?id=51fa3403b9f4af6040598c068afc447634c0f00101f90132592300000000009203124e6f72746865726e205465727269746f7279&geometry=geometry_5000&apiKey={API_KEY}",
-        "ACT": f"https://api.geoapify.com/v1/boundaries/consists-of?id=515036b8599a9e624059f3bd32b9e2c241c0f00101f90115ec23000000000092031c4175737472616c69616e204361706974616c205465727269746f7279&geometry=geometry_5000&apiKey={API_KEY}"
-    }
-    
-    # Define Australian states and their codes (for OpenStreetMap)
-    state_mapping = {
-        "Australia": "AU",
-        "NSW": "New South Wales",
-        "Victoria": "Victoria",
-        "Queensland": "Queensland",
-        "South Australia": "South Australia",
-        "Western Australia": "Western Australia",
-        "Tasmania": "Tasmania",
-        "Northern Territory": "Northern Territory",
-        "ACT": "Australian Capital Territory"
-    }
-
-    
-
+    # Check if --lookup option is specified
+    if args.lookup:
+        started = time.perf_counter()
+        try:
+            index = build_region_index(map_source)
+            count = lookup_file(index, args.lookup, args.lookup_output)
+        except (OSError, ValueError) as e:
+            print(f"Lookup failed: {e}", file=sys.stderr)
+        else:
+            elapsed = time.perf_counter() - started
+            print(f"Looked up {count} points in {elapsed:.2f}s ({count / elapsed:,.0f} points/s)", file=sys.stderr)
     # Check if --gen-all option is specified
-    if args.gen_all:
+    elif args.gen_all:
         # Generate all map variants
-        gen_all_maps(map_source=map_source, load_from_local=args.load_local)
+        gen_all_maps(map_source=map_source, load_from_local=args.load_local, osm_query=args.osm_query,
+                     cache_ttl_days=args.cache_ttl, renderer=args.renderer, outputs=args.outputs)
     else:
         # Modify URLs based on the --no-island option
         if not include_australia:
             urls.pop("Australia", None)
 
         # Generate the single requested map
-        draw_australia_with_boundaries(map_source=map_source, load_from_local=args.load_local, show_legends=show_legends)
+        draw_australia_with_boundaries(map_source=map_source, load_from_local=args.load_local, show_legends=show_legends,
+                                       osm_query=args.osm_query, cache_ttl_days=args.cache_ttl,
+                                       renderer=args.renderer, outputs=args.outputs)
+
+    if args.profile:
+        report = stop_profile()
+        report["command"] = sys.argv
+        with open(args.profile, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+        print(f"Profile written to {args.profile}", file=sys.stderr)
@@ -0,0 +1,467 @@
+"""Offline benchmarks for the Australia map pipeline.
+
+Replays recorded Overpass and Geoapify responses from a local stand-in HTTP
+server, so fetching, the cache formats, rendering and lookup can be timed
+repeatably without network access. Every scenario runs in a fresh scratch
+directory, and its wall time is reported with the per-stage breakdown of
+the script's --profile instrumentation (fetch, parse, cache, geometry,
+render). Results are printed as a table and can be written to a JSON file,
+so runs from different revisions can be compared.
+
+Fixtures are one response per request, in <fixtures>/overpass/<key>.json and
+<fixtures>/geoapify/<key>.json. Record them once by running the fetch
+scenarios through the server in proxy mode (needs network access, and a
+Geoapify key for the Geoapify fixtures), or let the server make up
+synthetic boundaries of a given size.
+
+Usage:
+    python benchmark.py --record fixtures
+    python benchmark.py --fixtures fixtures --json results.json
+    python benchmark.py --synthetic --vertices 50000 --latency 0.5
+"""
+
+import argparse
+import hashlib
+import importlib.util
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import requests
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Australia-State-Map.py")
+OVERPASS_PATH = "/api/interpreter"
+GEOAPIFY_PATH = "/v1/boundaries/consists-of"
+
+# Centre (lon, lat) and radii in degrees of the synthetic regions
+SYNTHETIC_REGIONS = {
+    "AU": (134, -25, 20, 16),
+    "New South Wales": (147, -32, 4, 4),
+    "Victoria": (144.5, -37, 2.5, 2),
+    "Queensland": (144, -21, 6, 7),
+    "South Australia": (135, -30, 5, 5),
+    "Western Australia": (122, -25, 9, 9),
+    "Tasmania": (146.5, -42, 1.5, 1.5),
+    "Northern Territory": (133, -19, 5, 6),
+    "Australian Capital Territory": (149, -35.5, 0.4, 0.4),
+}
+
+
+def load_pipeline():
+    """Import Australia-State-Map.py as a module"""
+    spec = importlib.util.spec_from_file_location("australia_state_map", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    # Registered so that render jobs can be pickled for worker processes
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def fixture_key(kind, request):
+    """File name of the fixture for an Overpass query or a Geoapify boundary id"""
+    if kind == "overpass":
+        request = " ".join(request.split())
+    return hashlib.sha256(request.encode()).hexdigest()[:16] + ".json"
+
+
+def _ring(cx, cy, rx, ry, vertices, clockwise=False):
+    angles = np.linspace(0, 2 * math.pi, vertices, endpoint=False)
+    if clockwise:
+        angles = angles[::-1]
+    ring = np.c_[cx + rx * np.cos(angles), cy + ry * np.sin(angles)]
+    return np.vstack([ring, ring[:1]])
+
+
+def synthetic_overpass(query, vertices):
+    """Overpass `out geom` response for the regions a query asks for.
+
+    Each outer ring is split into two ways, and Queensland gets a hole, so
+    the ring assembly is exercised as on real data.
+    """
+    # The bulk query asks for every admin_level=4 relation without naming one
+    bulk = 'relation["admin_level"="4"]["boundary"="administrative"](area.australia)' in query
+    elements = []
+    for rid, (name, (cx, cy, rx, ry)) in enumerate(SYNTHETIC_REGIONS.items(), start=1):
+        if name == "AU":
+            if '"ISO3166-1"="AU"];' not in query:
+                continue
+            tags = {"name": "Australia", "admin_level": "2", "ISO3166-1": "AU", "boundary": "administrative"}
+        elif bulk or f'"{name}"' in query:
+            tags = {"name": name, "admin_level": "4", "boundary": "administrative"}
+        else:
+            continue
+        ring = [{"lon": lon, "lat": lat} for lon, lat in _ring(cx, cy, rx, ry, vertices).tolist()]
+        half = len(ring) // 2
+        members = [{"type": "way", "ref": rid * 10, "role": "outer", "geometry": ring[:half + 1]},
+                   {"type": "way", "ref": rid * 10 + 1, "role": "outer", "geometry": ring[half:]}]
+        if name == "Queensland":
+            hole = _ring(cx, cy, rx / 4, ry / 4, vertices // 4, clockwise=True)
+            members.append({"type": "way", "ref": rid * 10 + 2, "role": "inner",
+                            "geometry": [{"lon": lon, "lat": lat} for lon, lat in hole.tolist()]})
+        elements.append({"type": "relation", "id": rid, "members": members, "tags": tags})
+    return {"version": 0.6, "generator": "benchmark.py", "elements": elements}
+
+
+def synthetic_geoapify(boundary_id, module, vertices):
+    """Geoapify consists-of response for a boundary id.
+
+    Like real responses, each region comes back as several features: the
+    region itself and two small islands off its coast.
+    """
+    state = {boundary: state for state, boundary in module.GEOAPIFY_IDS.items()}.get(boundary_id)
+    if state is None:
+        return None
+    cx, cy, rx, ry = SYNTHETIC_REGIONS[module.STATE_MAPPING[state]]
+    parts = [(cx, cy, rx, ry, vertices)]
+    parts += [(cx + side * rx * 1.1, cy, rx / 20, ry / 20, max(vertices // 20, 8)) for side in (-1, 1)]
+    return {"type": "FeatureCollection", "features": [{
+        "type": "Feature", "properties": {"name": state},
+        "geometry": {"type": "Polygon", "coordinates": [_ring(*part).tolist()]},
+    } for part in parts]}
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Local stand-in for the Overpass and Geoapify APIs.
+
+    mode is "replay" (serve fixtures), "record" (forward to the real APIs and
+    save what they return as fixtures) or "synthetic" (make responses up).
+    Every response is delayed by latency seconds. requests, misses and
+    bytes_sent count what was served, and served keeps the body of every
+    response by (kind, request) for check_regions.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, module, mode, fixtures=None, latency=0.0, vertices=5000,
+                 overpass_upstream=None, geoapify_upstream=None):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.module = module
+        self.mode = mode
+        # Absolute, since the scenarios run in scratch directories
+        self.fixtures = os.path.abspath(fixtures) if fixtures else None
+        self.latency = latency
+        self.vertices = vertices
+        self.overpass_upstream = overpass_upstream or module.OVERPASS_URL
+        self.geoapify_upstream = geoapify_upstream or module.GEOAPIFY_URL
+        self.requests = 0
+        self.misses = 0
+        self.bytes_sent = 0
+        self.served = {}
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def respond(self, kind, request, forward):
+        """Body of the response to a request, or None if there is none"""
+        path = os.path.join(self.fixtures, kind, fixture_key(kind, request)) if self.fixtures else None
+        if self.mode == "synthetic":
+            if kind == "overpass":
+                data = synthetic_overpass(request, self.vertices)
+            else:
+                data = synthetic_geoapify(request, self.module, self.vertices)
+            return None if data is None else json.dumps(data).encode()
+        if self.mode == "record":
+            response = forward()
+            if response.status_code != 200:
+                return None
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as fixture:
+                fixture.write(response.content)
+            return response.content
+        try:
+            with open(path, "rb") as fixture:
+                return fixture.read()
+        except FileNotFoundError:
+            return None
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        if urlparse(self.path).path != OVERPASS_PATH:
+            return self._send(None)
+        query = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())["data"][0]
+        self._send(self.server.respond("overpass", query, lambda: requests.post(
+            self.server.overpass_upstream, data={"data": query}, timeout=self.server.module.REQUEST_TIMEOUT)),
+            "overpass", query)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != GEOAPIFY_PATH:
+            return self._send(None)
+        boundary_id = parse_qs(url.query).get("id", [""])[0]
+        self._send(self.server.respond("geoapify", boundary_id, lambda: requests.get(
+            f"{self.server.geoapify_upstream}?{url.query}", timeout=self.server.module.REQUEST_TIMEOUT)),
+            "geoapify", boundary_id)
+
+    def _send(self, body, kind=None, request=None):
+        time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.requests += 1
+            if body is None:
+                self.server.misses += 1
+            else:
+                self.server.bytes_sent += len(body)
+                if kind is not None:
+                    self.server.served[kind, request] = body
+        self.send_response(200 if body is not None else 404)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body or b"")))
+        self.end_headers()
+        self.wfile.write(body or b"")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(module, mode, **options):
+    """Start a stand-in server and point the pipeline at it; returns the server"""
+    server = StandInServer(module, mode, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    module.OVERPASS_URL = server.base_url + OVERPASS_PATH
+    module.urls = module.region_urls(module.API_KEY, server.base_url + GEOAPIFY_PATH)
+    return server
+
+
+def check_regions(module, server, map_source):
+    """Check that every region cached in the current directory holds its own boundary.
+
+    A Geoapify region must be the response served for its boundary id, and an
+    OSM region may only hold relations that the served responses name after
+    it. Raises RuntimeError otherwise.
+    """
+    names = {}
+    for (kind, _), body in server.served.items():
+        if kind == "overpass":
+            for element in json.loads(body).get("elements", []):
+                tags = element.get("tags", {})
+                au = tags.get("ISO3166-1") == "AU" and tags.get("admin_level") == "2"
+                names[element.get("id")] = "AU" if au else tags.get("name")
+    for state in module.STATE_MAPPING:
+        entry = module.load_region_cache(map_source, state)
+        if entry is None:
+            continue
+        if map_source == "geoapify":
+            body = server.served.get(("geoapify", module.GEOAPIFY_IDS[state]))
+            wrong = body is not None and entry["data"] != json.loads(body)
+        else:
+            wrong = any(names.get(feature["properties"].get("osm_id"), module.STATE_MAPPING[state])
+                        != module.STATE_MAPPING[state] for feature in entry["data"]["features"])
+        if wrong:
+            raise RuntimeError(f"{state} was stored with a boundary that is not its own")
+
+
+def _states(module, map_source):
+    return list(module.urls) if map_source == "geoapify" else list(module.state_mapping)
+
+
+def _fetch(map_source, osm_query="bulk"):
+    def run(module):
+        module.load_boundary_frame(map_source, _states(module, map_source), osm_query=osm_query)
+    return run
+
+
+def _warm(map_source, lod=False):
+    """Setup that fills the boundary caches of a map source (and the LOD cache if lod)"""
+    def setup(module):
+        _fetch(map_source)(module)
+        if lod:
+            module.prepare_boundaries(map_source, _states(module, map_source), load_from_local=True)
+    return setup
+
+
+def _load(map_source, parquet):
+    def run(module):
+        saved = module.pyarrow
+        if not parquet:
+            module.pyarrow = None  # Skips the GeoParquet cache
+        try:
+            module.load_boundary_frame(map_source, _states(module, map_source), load_from_local=True)
+        finally:
+            module.pyarrow = saved
+    return run
+
+
+def _render(renderer, outputs=("png",), map_source="openstreetmap"):
+    def run(module):
+        states = _states(module, map_source)
+        gdf = module.prepare_boundaries(map_source, states, load_from_local=True)
+        if gdf is None:
+            raise RuntimeError("no boundaries to draw")
+        module.render_map(gdf, states, map_source, True, "benchmark.png", renderer=renderer, outputs=outputs)
+    return run
+
+
+def _gen_all(workers=None):
+    """gen_all_maps rendering in this process, or with `workers` processes (one per map by default)"""
+    def run(module):
+        module.gen_all_maps("openstreetmap", load_from_local=True, workers=workers or len(module.MAP_VARIANTS))
+    return run
+
+
+def _lookup(module):
+    index = module.build_region_index("openstreetmap")
+    rng = np.random.default_rng(1)
+    module.lookup_regions(index, rng.uniform(112, 154, 1_000_000), rng.uniform(-44, -10, 1_000_000))
+
+
+# name: (setup, run, map source); setup runs untimed in the same scratch directory
+SCENARIOS = {
+    "fetch-osm-bulk": (None, _fetch("openstreetmap", "bulk"), "openstreetmap"),
+    "fetch-osm-per-state": (None, _fetch("openstreetmap", "per-state"), "openstreetmap"),
+    "fetch-geoapify": (None, _fetch("geoapify"), "geoapify"),
+    "load-json": (_warm("openstreetmap"), _load("openstreetmap", parquet=False), "openstreetmap"),
+    "load-parquet": (_warm("openstreetmap"), _load("openstreetmap", parquet=True), "openstreetmap"),
+    "render-geopandas": (_warm("openstreetmap", lod=True), _render("geopandas"), "openstreetmap"),
+    "render-fast": (_warm("openstreetmap", lod=True), _render("fast"), "openstreetmap"),
+    "render-fast-all-outputs": (_warm("openstreetmap", lod=True), _render("fast", ("png", "thumb", "svg")), "openstreetmap"),
+    "render-fast-geoapify": (_warm("geoapify", lod=True), _render("fast", map_source="geoapify"), "geoapify"),
+    "gen-all": (_warm("openstreetmap", lod=True), _gen_all(workers=1), "openstreetmap"),
+    "gen-all-parallel": (_warm("openstreetmap", lod=True), _gen_all(), "openstreetmap"),
+    "lookup-1m": (_warm("openstreetmap"), _lookup, "openstreetmap"),
+}
+FETCH_SCENARIOS = ("fetch-osm-bulk", "fetch-osm-per-state", "fetch-geoapify")
+# Scenarios whose setup fills the LOD cache, so their timed run must not simplify again
+CACHED_LOD_SCENARIOS = ("render-geopandas", "render-fast", "render-fast-all-outputs", "render-fast-geoapify",
+                        "gen-all", "gen-all-parallel")
+
+
+def _check_misses(server, before, when):
+    if server.misses > before:
+        hint = ("the upstream API failed" if server.mode == "record"
+                else f"no fixture in {server.fixtures}; record them with --record" if server.mode == "replay"
+                else "not a synthetic region")
+        raise RuntimeError(f"{server.misses - before} requests {when} had no response ({hint})")
+
+
+def benchmark_run(module, server, name, repeat=1, trace_memory=False):
+    """Run one scenario `repeat` times, each in a fresh scratch directory, and return a result record.
+
+    Time is the best of the repeats; the stage breakdown and the bytes served
+    are those of the best run. With trace_memory, stages also record their
+    peak memory, at the cost of slower runs. Raises RuntimeError if the server
+    had no response for a request, in the setup or the timed run, since the
+    timing would then be of missing data, or if check_regions finds a region
+    stored with another region's boundary.
+    """
+    setup, run, map_source = SCENARIOS[name]
+    best = None
+    cwd = os.getcwd()
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as scratch:
+            os.chdir(scratch)
+            try:
+                misses = server.misses
+                server.served.clear()
+                if setup is not None:
+                    setup(module)
+                    _check_misses(server, misses, "in the setup")
+                requests_before, bytes_before = server.requests, server.bytes_sent
+                module.start_profile(trace_memory=trace_memory)
+                started = time.perf_counter()
+                try:
+                    run(module)
+                finally:
+                    seconds = time.perf_counter() - started
+                    report = module.stop_profile()
+                check_regions(module, server, map_source)
+            finally:
+                os.chdir(cwd)
+        _check_misses(server, misses, "in the run")
+        if name in CACHED_LOD_SCENARIOS and "lod.simplify" in report["stages"]:
+            raise RuntimeError(f"{name}: the level-of-detail cache filled by the setup was not used")
+        if best is None or seconds < best["seconds"]:
+            best = {
+                "scenario": name, "map_source": map_source, "seconds": seconds,
+                "requests": server.requests - requests_before, "bytes_served": server.bytes_sent - bytes_before,
+                "peak_bytes": report["peak_bytes"], "stages": report["stages"],
+            }
+    return best
+
+
+def _top_stages(stages, count=3):
+    return ", ".join(f"{name} {record['seconds']:.2f}s" for name, record in list(stages.items())[:count])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Australia map pipeline offline.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--fixtures", metavar="DIR", default="fixtures",
+                        help="Replay the recorded responses in DIR (default: fixtures)")
+    source.add_argument("--synthetic", action="store_true",
+                        help="Serve made-up boundaries instead of recorded ones")
+    source.add_argument("--record", metavar="DIR",
+                        help="Run the fetch scenarios against the real APIs and record the responses to DIR")
+    parser.add_argument("--vertices", type=int, default=20000,
+                        help="Vertices per synthetic boundary ring (default: 20000)")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds the stand-in server waits before each response (default: 0)")
+    parser.add_argument("--host-limit", type=int, default=2,
+                        help="Concurrent requests allowed to the stand-in server (default: 2, as for Overpass)")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS),
+                        help="Scenarios to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Runs per scenario, best one reported (default: 3)")
+    parser.add_argument("--memory", action="store_true",
+                        help="Record the peak memory of every stage (slower)")
+    parser.add_argument("--json", metavar="PATH", help="Write the results to a JSON file")
+    args = parser.parse_args()
+
+    if not args.record and not args.synthetic and not os.path.isdir(args.fixtures):
+        parser.error(f"no fixtures in {args.fixtures}; record them with --record {args.fixtures}, or use --synthetic")
+
+    module = load_pipeline()
+    if args.record:
+        server = start_server(module, "record", fixtures=args.record)
+        scenarios = [name for name in FETCH_SCENARIOS if name != "fetch-geoapify" or module.API_KEY]
+        repeat = 1
+    else:
+        mode = "synthetic" if args.synthetic else "replay"
+        server = start_server(module, mode, fixtures=None if args.synthetic else args.fixtures,
+                              latency=args.latency, vertices=args.vertices)
+        scenarios = args.scenarios
+        repeat = args.repeat
+    module.HOST_LIMITS["127.0.0.1"] = args.host_limit
+
+    results = []
+    failed = []
+    print(f"{'scenario':>24} {'seconds':>9} {'requests':>8} {'MB served':>9} {'peak MiB':>9}  slowest stages")
+    for name in scenarios:
+        try:
+            record = benchmark_run(module, server, name, repeat, args.memory)
+        except (RuntimeError, ValueError) as e:
+            failed.append(name)
+            print(f"{name:>24} failed: {e}")
+            continue
+        results.append(record)
+        peak = f"{record['peak_bytes'] / 2**20:>9.1f}" if record["peak_bytes"] is not None else f"{'-':>9}"
+        print(f"{name:>24} {record['seconds']:>9.3f} {record['requests']:>8} "
+              f"{record['bytes_served'] / 1e6:>9.2f} {peak}  {_top_stages(record['stages'])}")
+    if args.record:
+        print(f"Fixtures recorded to {args.record}")
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                       "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "source": "record" if args.record else "synthetic" if args.synthetic else args.fixtures,
+                       "vertices": args.vertices if args.synthetic else None, "latency": args.latency,
+                       "results": results}, file, indent=2)
+        print(f"Results written to {args.json}")
+    server.shutdown()
+    if failed:
+        sys.exit(f"{len(failed)} scenarios failed: {' '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Benchmarks for the headless Knight's Tour solver.
+
+Sweeps board sizes, start squares, tie-break rules and engine/backend
+combinations through solve_knights_tour and records wall time, nodes,
+backtracks and peak memory for each run. Results are printed as a table
+and can be written to a JSON file, so runs from different revisions can
+be compared. No display is needed.
+
+Usage:
+    python benchmark.py --sizes 8 16 32 --tiebreaks moves centre --json results.json
+    python benchmark.py --sizes 50 --profile search.prof
+"""
+
+import argparse
+import cProfile
+import json
+import platform
+import pstats
+import time
+import tracemalloc
+
+from knights_tour import BACKENDS, ENGINES, PRUNING, TIEBREAKS, choose_backend, solve_knights_tour
+
+# Engine/backend pairs that can run every tie-break rule on any board size
+CONFIGS = ("iterative/list", "iterative/array", "recursive/list")
+
+
+def benchmark_run(rows, cols, start, tiebreak, engine, backend, prune="none", max_nodes=None,
+                  repeat=1, profiler=None):
+    """Solve one configuration ``repeat`` times and return a result record.
+
+    Time is the best of the repeats. Peak memory is measured with tracemalloc
+    on a separate run, because tracing slows the search down. An untraced run
+    before it builds the cached neighbour tables, so neither the memory nor
+    the timed runs include them, whichever configuration runs first. With a
+    cProfile ``profiler``, it is enabled around the timed runs.
+    """
+    solve_knights_tour(rows, cols, start=start, engine=engine, backend=backend,
+                       tiebreak=tiebreak, prune=prune, max_nodes=max_nodes)
+    tracemalloc.start()
+    try:
+        solve_knights_tour(rows, cols, start=start, engine=engine, backend=backend,
+                           tiebreak=tiebreak, prune=prune, max_nodes=max_nodes)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    times = []
+    for _ in range(repeat):
+        if profiler is not None:
+            profiler.enable()
+        try:
+            started = time.perf_counter()
+            result = solve_knights_tour(rows, cols, start=start, engine=engine, backend=backend,
+                                        tiebreak=tiebreak, prune=prune, max_nodes=max_nodes)
+            times.append(time.perf_counter() - started)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+
+    if backend == "auto":
+        backend = choose_backend(rows, cols, engine, tiebreak, prune)
+    return {
+        "rows": rows, "cols": cols, "start": list(start), "tiebreak": tiebreak,
+        "engine": engine, "backend": backend, "prune": prune,
+        "solved": result.solved, "aborted": result.aborted,
+        "nodes": result.nodes, "backtracks": result.backtracks, "pruned": result.pruned,
+        "seconds": min(times), "nodes_per_second": result.nodes / min(times) if min(times) else 0,
+        "peak_bytes": peak,
+    }
+
+
+def _starts(rows, cols, names):
+    squares = {"corner": (0, 0), "edge": (0, cols // 2), "centre": (rows // 2, cols // 2)}
+    return [(name, squares[name]) for name in names]
+
+
+def run_benchmarks(sizes, starts=("corner",), tiebreaks=("moves",), configs=CONFIGS,
+                   prune="none", max_nodes_per_square=None, repeat=1, profiler=None):
+    """Yield a result record for every combination of the given options.
+
+    ``configs`` are "engine/backend" strings. Combinations the solver does
+    not support (the recursive engine beyond the recursion limit, the
+    bitboard beyond 64 squares, ...) are skipped.
+    """
+    for size in sizes:
+        rows, cols = size if isinstance(size, tuple) else (size, size)
+        max_nodes = max_nodes_per_square * rows * cols if max_nodes_per_square else None
+        for start_name, start in _starts(rows, cols, starts):
+            for tiebreak in tiebreaks:
+                for config in configs:
+                    engine, backend = config.split("/")
+                    if engine == "recursive" and rows * cols > 900:
+                        continue
+                    try:
+                        record = benchmark_run(rows, cols, start, tiebreak, engine, backend,
+                                               prune, max_nodes, repeat, profiler)
+                    except ValueError:
+                        continue
+                    record["start_name"] = start_name
+                    yield record
+
+
+def _size(text):
+    rows, _, cols = text.partition("x")
+    return (int(rows), int(cols or rows))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the headless Knight's Tour solver.")
+    parser.add_argument("--sizes", type=_size, nargs="+", default=[8, 16, 32, 64],
+                        metavar="N|RxC", help="Board sizes (default: 8 16 32 64)")
+    parser.add_argument("--starts", nargs="+", choices=("corner", "edge", "centre"),
+                        default=["corner"], help="Start squares (default: corner)")
+    parser.add_argument("--tiebreaks", nargs="+", choices=TIEBREAKS, default=["moves"],
+                        help="Tie-break rules (default: moves)")
+    parser.add_argument("--configs", nargs="+", default=list(CONFIGS),
+                        choices=[f"{engine}/{backend}" for engine in sorted(ENGINES)
+                                 for backend in BACKENDS],
+                        metavar="ENGINE/BACKEND",
+                        help=f"Engine/backend pairs (default: {' '.join(CONFIGS)})")
+    parser.add_argument("--prune", choices=PRUNING, default="none",
+                        help="Pruning for every run (default: none)")
+    parser.add_argument("--max-nodes-per-square", type=int, default=10,
+                        help="Give up a run after this many nodes per square (default: 10)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Timed runs per configuration, best one reported (default: 3)")
+    parser.add_argument("--json", metavar="PATH", help="Write the results to a JSON file")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="Profile the timed runs with cProfile, save the stats to PATH "
+                             "and print the top functions")
+    args = parser.parse_args()
+
+    profiler = cProfile.Profile() if args.profile else None
+    results = []
+    print(f"{'board':>9} {'start':>7} {'tiebreak':>9} {'config':>16} {'nodes':>9} "
+          f"{'backtracks':>10} {'seconds':>9} {'peak KiB':>9}")
+    for record in run_benchmarks(args.sizes, args.starts, args.tiebreaks, args.configs,
+                                 args.prune, args.max_nodes_per_square, args.repeat, profiler):
+        results.append(record)
+        status = "" if record["solved"] else " aborted" if record["aborted"] else " no tour"
+        print(f"{record['rows']:>4}x{record['cols']:<4} {record['start_name']:>7} "
+              f"{record['tiebreak']:>9} {record['engine'] + '/' + record['backend']:>16} "
+              f"{record['nodes']:>9} {record['backtracks']:>10} {record['seconds']:>9.4f} "
+              f"{record['peak_bytes'] / 1024:>9.1f}{status}")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                       "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results},
+                      file, indent=2)
+        print(f"Results written to {args.json}")
+    if profiler is not None:
+        profiler.dump_stats(args.profile)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+
+
+if __name__ == "__main__":
+    main()
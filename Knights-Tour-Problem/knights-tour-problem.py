@@ -1,15 +1,16 @@
+import argparse
 
 import pygame
-import time
 
-# Initialize Pygame
-pygame.init()
+from knights_tour import BACKTRACK, DEFAULT_CACHE, MOVE, TourCache, TourResult, iter_knights_tour
 
 # Constants
 BOARD_SIZE = 8
 SQUARE_SIZE = 60
 WINDOW_SIZE = BOARD_SIZE * SQUARE_SIZE
-DELAY = 0.2  # Delay between moves (in seconds) for animation
+FPS = 60  # Frames drawn per second
+SPEED = 5  # Solver steps (moves or backtracks) shown per second
+MAX_SPEED = 100_000
 
 # Colors
 WHITE = (255, 255, 255)
@@ -18,133 +19,209 @@ LIGHT_BROWN = (222, 184, 135)
 YELLOW = (255, 235, 59)
 BLACK = (0, 0, 0)
 
-# Set up the display
-screen = pygame.display.set_mode((WINDOW_SIZE, WINDOW_SIZE))
-pygame.display.set_caption("Knight's Tour Solver")
-
-# Load knight image (you can replace this with a path to a knight image)
-# For simplicity, we'll draw a circle if no image is available
-try:
-    knight_image = pygame.image.load("knight.png")
-    knight_image = pygame.transform.scale(knight_image, (SQUARE_SIZE - 10, SQUARE_SIZE - 10))
-except:
-    knight_image = None
-
-# Font for displaying move numbers
-font = pygame.font.Font(None, 24)
-
-# Possible knight moves (L-shape)
-moves = [
-    (2, 1), (2, -1), (-2, 1), (-2, -1),
-    (1, 2), (1, -2), (-1, 2), (-1, -2)
-]
-
-# Board to keep track of moves
-board = [[-1 for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
-
-# Check if a position is valid
-def is_valid(x, y):
-    return 0 <= x < BOARD_SIZE and 0 <= y < BOARD_SIZE and board[x][y] == -1
+# Display state, created by init_display() so importing this module stays headless
+screen = None
+knight_image = None
+font = None
+background = None  # Pre-rendered empty chessboard
+glyphs = {}  # Move number -> rendered text surface
+knight_pos = None  # Square the knight was last drawn on
 
-# Get the number of possible moves from a position (Warnsdorff's heuristic)
-def get_degree(x, y):
-    count = 0
-    for dx, dy in moves:
-        next_x, next_y = x + dx, y + dy
-        if is_valid(next_x, next_y):
-            count += 1
-    return count
+# Board to keep track of the replayed moves
+board = [[-1 for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
 
-# Draw the chessboard and the knight's path
-def draw_board(current_pos=None):
+# Set up the display
+def init_display():
+    global screen, knight_image, font, background
+    pygame.init()
+    screen = pygame.display.set_mode((WINDOW_SIZE, WINDOW_SIZE))
+    pygame.display.set_caption("Knight's Tour Solver")
+
+    # Load knight image (you can replace this with a path to a knight image)
+    # For simplicity, we'll draw a circle if no image is available
+    try:
+        knight_image = pygame.image.load("knight.png")
+        knight_image = pygame.transform.scale(knight_image, (SQUARE_SIZE - 10, SQUARE_SIZE - 10))
+    except:
+        knight_image = None
+
+    # Font for displaying move numbers
+    font = pygame.font.Font(None, 24)
+    glyphs.clear()
+
+    # Render the empty board once; squares are restored from it when they change
+    background = pygame.Surface((WINDOW_SIZE, WINDOW_SIZE))
     for row in range(BOARD_SIZE):
         for col in range(BOARD_SIZE):
-            # Draw the square
             color = LIGHT_BROWN if (row + col) % 2 == 0 else BROWN
-            pygame.draw.rect(screen, color, (col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
-
-            # Draw the move number if the square has been visited
-            if board[row][col] != -1:
-                pygame.draw.rect(screen, YELLOW, (col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
-                text = font.render(str(board[row][col]), True, BLACK)
-                text_rect = text.get_rect(center=(col * SQUARE_SIZE + SQUARE_SIZE // 2, row * SQUARE_SIZE + SQUARE_SIZE // 2))
-                screen.blit(text, text_rect)
-
-    # Draw the knight at the current position
-    if current_pos:
-        row, col = current_pos
+            pygame.draw.rect(background, color, square_rect(row, col))
+
+# Screen rectangle covered by a square
+def square_rect(row, col):
+    return pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+
+# Rendered move number, rasterized only the first time it is needed
+def number_glyph(move_num):
+    glyph = glyphs.get(move_num)
+    if glyph is None:
+        glyph = glyphs[move_num] = font.render(str(move_num), True, BLACK)
+    return glyph
+
+# Redraw a single square (background, move number and knight) and return its rectangle
+def draw_square(row, col):
+    rect = square_rect(row, col)
+    if board[row][col] != -1:
+        pygame.draw.rect(screen, YELLOW, rect)
+        glyph = number_glyph(board[row][col])
+        screen.blit(glyph, glyph.get_rect(center=rect.center))
+    else:
+        screen.blit(background, rect, rect)
+
+    if knight_pos == (row, col):
         if knight_image:
-            screen.blit(knight_image, (col * SQUARE_SIZE + 5, row * SQUARE_SIZE + 5))
+            screen.blit(knight_image, (rect.x + 5, rect.y + 5))
         else:
-            pygame.draw.circle(screen, BLACK, (col * SQUARE_SIZE + SQUARE_SIZE // 2, row * SQUARE_SIZE + SQUARE_SIZE // 2), SQUARE_SIZE // 3)
+            pygame.draw.circle(screen, BLACK, rect.center, SQUARE_SIZE // 3)
+    return rect
 
+# Draw the whole chessboard and the knight's path
+def draw_board(current_pos=None):
+    global knight_pos
+    knight_pos = tuple(current_pos) if current_pos else None
+    screen.blit(background, (0, 0))
+    for row in range(BOARD_SIZE):
+        for col in range(BOARD_SIZE):
+            if board[row][col] != -1 or knight_pos == (row, col):
+                draw_square(row, col)
     pygame.display.flip()
 
-# Solve the Knight's Tour using backtracking and Warnsdorff's heuristic
-def solve_knights_tour(x, y, move_num):
-    # Mark the current position
-    board[x][y] = move_num
-    draw_board((x, y))
-    time.sleep(DELAY)
-
-    # Base case: if all squares are visited
-    if move_num == BOARD_SIZE * BOARD_SIZE - 1:
-        return True
-
-    # Get all possible moves and sort by degree (Warnsdorff's heuristic)
-    next_moves = []
-    for dx, dy in moves:
-        next_x, next_y = x + dx, y + dy
-        if is_valid(next_x, next_y):
-            degree = get_degree(next_x, next_y)
-            next_moves.append((next_x, next_y, degree))
-    next_moves.sort(key=lambda m: m[2])  # Sort by degree
-
-    # Try each possible move
-    for next_x, next_y, _ in next_moves:
-        if solve_knights_tour(next_x, next_y, move_num + 1):
-            return True
-
-    # Backtrack: unmark the current position
-    board[x][y] = -1
-    draw_board((x, y))
-    time.sleep(DELAY)
-    return False
-
-# Main function to start the Knight's Tour
-def main():
-    # Initialize the board
-    draw_board()
-
-    # Start the Knight's Tour from position (0,0)
-    start_x, start_y = 0, 0
-    board[start_x][start_y] = 0
-    draw_board((start_x, start_y))
+# Redraw only the changed squares and the knight's old and new squares
+def update_squares(changed, current_pos=None):
+    global knight_pos
+    dirty = set(changed)
+    if knight_pos:
+        dirty.add(knight_pos)
+    knight_pos = tuple(current_pos) if current_pos else None
+    if knight_pos:
+        dirty.add(knight_pos)
+    pygame.display.update([draw_square(row, col) for row, col in dirty])
+
+# Apply one solver event to the board and return the square it changed
+def apply_event(event):
+    kind, (x, y), move_num = event
+    if kind == MOVE:
+        board[x][y] = move_num
+    elif kind == BACKTRACK:
+        board[x][y] = -1
+    return x, y
+
+# Show the animation state in the window title
+def set_caption(speed, paused, finished):
+    state = "finished" if finished else "paused" if paused else f"{speed:g} steps/s"
+    pygame.display.set_caption(f"Knight's Tour Solver - {state} "
+                               "(Space: pause, Right: step, Up/Down: speed)")
+
+# Run the solver a few steps per frame, keeping the window responsive.
+# Returns the solver's TourResult, or None if the window was closed first.
+def animate(steps, speed=SPEED, fps=FPS):
+    clock = pygame.time.Clock()
+    paused = False
+    result = None
+    finished = False
+    owed = 0.0  # Steps due but not yet shown, carried between frames
+    set_caption(speed, paused, finished)
 
-    # Solve the tour
-    running = True
-    solving = True
-    while running:
+    while True:
+        single_steps = 0
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                running = False
-
-        if solving:
-            if solve_knights_tour(start_x, start_y, 0):
-                print("Knight's Tour completed!")
-                solving = False
+                return result if finished else None
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_SPACE:
+                    paused = not paused
+                elif event.key == pygame.K_RIGHT:
+                    paused = True
+                    single_steps += 1
+                elif event.key == pygame.K_UP:
+                    speed = min(speed * 2, MAX_SPEED)
+                elif event.key == pygame.K_DOWN:
+                    speed = max(speed / 2, 0.5)
+                set_caption(speed, paused, finished)
+
+        if not finished:
+            if single_steps:
+                count = single_steps
+            elif paused:
+                count = 0
             else:
-                print("No solution exists starting from (0,0).")
-                solving = False
+                owed += speed / fps
+                count = int(owed)
+                owed -= count
+
+            changed = []
+            current = None
+            try:
+                for _ in range(count):
+                    current = apply_event(next(steps))
+                    changed.append(current)
+            except StopIteration as stop:
+                result = stop.value
+                finished = True
+                print("Knight's Tour completed!" if result.solved
+                      else f"No solution exists starting from {result.start}.")
+                set_caption(speed, paused, finished)
+            if changed:
+                update_squares(changed, current)
+
+        clock.tick(fps)
+
+# Play a finished tour move by move, in the same form as iter_knights_tour()
+def tour_steps(result):
+    for move_num, square in enumerate(result.path):
+        yield MOVE, square, move_num
+    return result
+
+# Run the solver step by step like iter_knights_tour(), storing its result in
+# the tour cache once the search finishes
+def stored_search(tours, start):
+    result = yield from iter_knights_tour(BOARD_SIZE, start=start)
+    tours.put(BOARD_SIZE, BOARD_SIZE, result.start, result.tiebreak, result.path)
+    return result
 
-        pygame.display.flip()
+# Main function to start the Knight's Tour
+def main(start=(0, 0), speed=SPEED, fps=FPS, cache=None):
+    init_display()
 
-    # Keep the window open until the user closes it
-    while True:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                return
+    # Initialize the board
+    draw_board()
+
+    if cache:
+        # Animate the stored tour; on a miss the search is animated as without
+        # the cache, and its tour is stored when it finishes
+        with TourCache(cache) as tours:
+            start = tuple(start)
+            path = tours.get(BOARD_SIZE, BOARD_SIZE, start, "moves")
+            if path is not None:
+                steps = tour_steps(TourResult(rows=BOARD_SIZE, cols=BOARD_SIZE, start=start,
+                                              path=path, cached=True))
+            else:
+                steps = stored_search(tours, start)
+            animate(steps, speed, fps)
+    else:
+        # The solver runs inside the event loop, a few steps per frame
+        animate(iter_knights_tour(BOARD_SIZE, start=start), speed, fps)
+    pygame.quit()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Visualize the Knight's Tour with pygame.")
+    parser.add_argument("--start", type=int, nargs=2, default=(0, 0), metavar=("ROW", "COL"),
+                        help="Start square (default: 0 0)")
+    parser.add_argument("--speed", type=float, default=SPEED,
+                        help=f"Solver steps shown per second (default: {SPEED})")
+    parser.add_argument("--fps", type=int, default=FPS,
+                        help=f"Frames drawn per second (default: {FPS})")
+    parser.add_argument("--cache", nargs="?", const=DEFAULT_CACHE, metavar="PATH",
+                        help="Animate the tour from the on-disk tour cache instead of the search "
+                             f"(default path: {DEFAULT_CACHE})")
+    args = parser.parse_args()
+    main(start=args.start, speed=args.speed, fps=args.fps, cache=args.cache)
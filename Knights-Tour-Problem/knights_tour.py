@@ -0,0 +1,1559 @@
+"""Headless Knight's Tour solver.
+
+This module contains the search only: it never imports pygame and never
+sleeps, so it can be imported by batch jobs and headless workers. The pygame
+visualizer in ``knights-tour-problem.py`` steps iter_knights_tour() from its
+event loop.
+
+Usage:
+    from knights_tour import solve_knights_tour
+    result = solve_knights_tour(8, start=(0, 0))
+    print(result.solved, result.path[:5], result.backtracks)
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from array import array
+from dataclasses import dataclass, field
+from functools import lru_cache
+from operator import itemgetter
+
+# Possible knight moves (L-shape)
+MOVES = [
+    (2, 1), (2, -1), (-2, 1), (-2, -1),
+    (1, 2), (1, -2), (-1, 2), (-1, -2)
+]
+
+# Trace event kinds recorded when ``trace=True``
+MOVE = "move"
+BACKTRACK = "backtrack"
+
+
+@dataclass
+class TourResult:
+    """Outcome of a single Knight's Tour search"""
+    rows: int
+    cols: int
+    start: tuple
+    path: list  # [(row, col), ...] in visiting order
+    nodes: int = 0  # squares placed, including the ones later backtracked
+    backtracks: int = 0
+    elapsed: float = 0.0  # seconds
+    trace: list = field(default=None, repr=False)  # [(kind, (row, col), move_num), ...]
+    aborted: bool = False  # stopped by max_nodes or should_stop before finishing
+    tiebreak: str = "moves"
+    pruned: int = 0  # positions cut off by dead-end or connectivity pruning
+    cached: bool = False  # loaded from a TourCache instead of searched
+
+    @property
+    def solved(self):
+        return len(self.path) == self.rows * self.cols
+
+    def board(self):
+        """Return the tour as a grid of move numbers (-1 for unvisited squares)"""
+        grid = [[-1] * self.cols for _ in range(self.rows)]
+        for move_num, (row, col) in enumerate(self.path):
+            grid[row][col] = move_num
+        return grid
+
+
+# Squares are numbered row * cols + col so the search state is flat sequences
+# indexed by square: visited[sq] is 0/1 and degree[sq] the Warnsdorff degree.
+# The "list" backend stores them as Python lists, the "array" backend as
+# bytearrays (one byte per square instead of an 8-byte pointer), and the
+# "bitboard" backend keeps the visited set of boards up to 64 squares in a
+# single integer.
+
+@lru_cache(maxsize=None)
+def neighbour_table(rows, cols, moves=tuple(MOVES)):
+    """For every square, the squares a knight can reach from it, in ``moves`` order"""
+    table = []
+    for square in range(rows * cols):
+        x, y = divmod(square, cols)
+        table.append(tuple((x + dx) * cols + (y + dy) for dx, dy in moves
+                           if 0 <= x + dx < rows and 0 <= y + dy < cols))
+    return tuple(table)
+
+
+def _ordered_moves(visited, key, neighbours, square):
+    """Unvisited knight moves from ``square``, sorted by ``key`` (Warnsdorff degree first)"""
+    next_moves = [n for n in neighbours[square] if not visited[n]]
+    next_moves.sort(key=key)  # Stable: remaining ties keep the order of the move table
+    return next_moves
+
+
+@lru_cache(maxsize=None)
+def knight_masks(rows, cols):
+    """Bitboard of the knight moves from every square of a board up to 64 squares"""
+    return tuple(sum(1 << n for n in moves) for moves in neighbour_table(rows, cols))
+
+
+@lru_cache(maxsize=None)
+def _bitboard_moves(rows, cols, moves=tuple(MOVES)):
+    # For every square, (bit, square, move mask) of each knight move in ``moves`` order
+    masks = knight_masks(rows, cols)
+    return tuple(tuple((1 << n, n, masks[n]) for n in squares)
+                 for squares in neighbour_table(rows, cols, moves))
+
+
+def move_orders(count):
+    """``count`` different tie-breaking orders of MOVES (at most 16).
+
+    Warnsdorff ties are broken by move order, so each order is a different
+    search. Orders are the rotations of MOVES followed by those of its reverse.
+    """
+    if not 1 <= count <= 2 * len(MOVES):
+        raise ValueError(f"Between 1 and {2 * len(MOVES)} move orders are available, got {count}")
+    orders = []
+    for base in (MOVES, MOVES[::-1]):
+        for shift in range(len(base)):
+            orders.append(tuple(base[shift:] + base[:shift]))
+    return orders[:count]
+
+
+# Tie-breaking rules for candidates with the same Warnsdorff degree:
+#   "moves"    - the order of the move table (MOVES, or the ``moves`` argument)
+#   "pohl"     - Pohl's second-level lookahead: the smallest total degree of
+#                the candidate's own unvisited neighbours
+#   "squirrel" - a fixed move order chosen by board size, in the manner of
+#                Squirrel and Cull (see SQUIRREL_ORDERS)
+#   "centre"   - the candidate farthest from the centre of the board
+TIEBREAKS = ("moves", "pohl", "squirrel", "centre")
+
+# Index into move_orders(16) per board size mod 8. Each entry is the order
+# that completes corner-start tours without backtracking on the longest run
+# of square boards of its class; together they never backtrack from 5x5 to
+# 117x117 and still manage about nine sizes in ten up to 200x200. Larger
+# boards are better served by the "centre" rule or construct_knights_tour.
+SQUIRREL_ORDERS = {0: 0, 1: 2, 2: 2, 3: 11, 4: 7, 5: 15, 6: 12, 7: 11}
+
+
+def squirrel_moves(rows, cols):
+    """The fixed tie-breaking move order used by the "squirrel" rule"""
+    return move_orders(16)[SQUIRREL_ORDERS[min(rows, cols) % 8]]
+
+
+def _tiebreak_key(tiebreak, rows, cols, visited, degree, neighbours):
+    """Sort key for candidate squares under ``tiebreak``"""
+    if tiebreak == "pohl":
+        return lambda n: (degree[n], sum(degree[m] for m in neighbours[n] if not visited[m]))
+    if tiebreak == "centre":
+        # Squared distance from the centre, doubled to stay in integers; negated
+        # so the farthest square sorts first
+        far = [-((2 * (sq // cols) - rows + 1) ** 2 + (2 * (sq % cols) - cols + 1) ** 2)
+               for sq in range(rows * cols)]
+        return lambda n: (degree[n], far[n])
+    return degree.__getitem__
+
+
+# Searches check their budget (max_nodes, should_stop) every CHECK_INTERVAL
+# placed squares; should_stop may be slow, e.g. a cross-process event.
+CHECK_INTERVAL = 4096
+
+
+class _Aborted(Exception):
+    pass
+
+
+def _budget(max_nodes, should_stop):
+    """Return (first node count to check at, check function)"""
+    if max_nodes is None and should_stop is None:
+        return float("inf"), None
+
+    def check(nodes):
+        """Raise _Aborted if the search is over budget, else return the next check point"""
+        if max_nodes is not None and nodes >= max_nodes:
+            raise _Aborted
+        if should_stop is not None and should_stop():
+            raise _Aborted
+        next_check = nodes + CHECK_INTERVAL
+        return next_check if max_nodes is None else min(next_check, max_nodes)
+
+    return (CHECK_INTERVAL if max_nodes is None else min(CHECK_INTERVAL, max_nodes)), check
+
+
+_popcount = getattr(int, "bit_count", None) or (lambda mask: bin(mask).count("1"))
+
+
+# degree[sq] is the number of unvisited neighbours of sq. It is updated when a
+# square is visited and restored when it is backtracked, so ordering the
+# candidates reads a degree instead of rescanning eight moves per candidate.
+# ``key`` orders the candidates: degree.__getitem__, or one of the tie-breaking
+# keys built by _tiebreak_key.
+
+def _search_recursive(visited, degree, key, neighbours, cols, square, path, stats, trace, budget,
+                      move_num=0):
+    # Mark the current position
+    visited[square] = 1
+    for n in neighbours[square]:
+        degree[n] -= 1
+    path.append(square)
+    stats["nodes"] += 1
+    if trace is not None:
+        trace.append((MOVE, divmod(square, cols), move_num))
+    if stats["nodes"] >= budget[0]:
+        budget[0] = budget[1](stats["nodes"])
+
+    # Base case: if all squares are visited
+    if move_num == len(visited) - 1:
+        return True
+
+    # Try each possible move, fewest onward moves first
+    for next_square in _ordered_moves(visited, key, neighbours, square):
+        if _search_recursive(visited, degree, key, neighbours, cols, next_square, path, stats,
+                             trace, budget, move_num + 1):
+            return True
+
+    # Backtrack: unmark the current position
+    visited[square] = 0
+    for n in neighbours[square]:
+        degree[n] += 1
+    path.pop()
+    stats["backtracks"] += 1
+    if trace is not None:
+        trace.append((BACKTRACK, divmod(square, cols), move_num))
+    return False
+
+
+def _search_iterative(visited, degree, key, neighbours, cols, square, path, stats, trace, budget):
+    # Same search as _search_recursive, but with an explicit stack: path[d] is
+    # the square at depth d, candidates[d] its ordered moves and cursor[d] the
+    # index of the next candidate to try.
+    total = len(visited)
+    candidates = []
+    cursor = []
+    check_at, check = budget
+
+    visited[square] = 1
+    for n in neighbours[square]:
+        degree[n] -= 1
+    path.append(square)
+    stats["nodes"] += 1
+    if trace is not None:
+        trace.append((MOVE, divmod(square, cols), 0))
+    if total == 1:
+        return True
+    candidates.append(_ordered_moves(visited, key, neighbours, square))
+    cursor.append(0)
+
+    while path:
+        depth = len(path) - 1
+        moves_here = candidates[depth]
+        i = cursor[depth]
+        if i < len(moves_here):
+            cursor[depth] = i + 1
+            square = moves_here[i]
+            move_num = depth + 1
+            visited[square] = 1
+            for n in neighbours[square]:
+                degree[n] -= 1
+            path.append(square)
+            stats["nodes"] += 1
+            if trace is not None:
+                trace.append((MOVE, divmod(square, cols), move_num))
+            if move_num == total - 1:
+                return True
+            if stats["nodes"] >= check_at:
+                check_at = check(stats["nodes"])
+            candidates.append(_ordered_moves(visited, key, neighbours, square))
+            cursor.append(0)
+        else:
+            # Backtrack: every candidate from this square failed
+            square = path.pop()
+            visited[square] = 0
+            for n in neighbours[square]:
+                degree[n] += 1
+            candidates.pop()
+            cursor.pop()
+            stats["backtracks"] += 1
+            if trace is not None:
+                trace.append((BACKTRACK, divmod(square, cols), depth))
+    return False
+
+
+def _search_steps(visited, degree, key, neighbours, cols, square, path, stats):
+    # _search_iterative as a generator: yields each trace event as it happens
+    # and returns whether a tour was found, so a caller can run the search a
+    # few steps at a time.
+    total = len(visited)
+    candidates = []
+    cursor = []
+
+    visited[square] = 1
+    for n in neighbours[square]:
+        degree[n] -= 1
+    path.append(square)
+    stats["nodes"] += 1
+    yield MOVE, divmod(square, cols), 0
+    if total == 1:
+        return True
+    candidates.append(_ordered_moves(visited, key, neighbours, square))
+    cursor.append(0)
+
+    while path:
+        depth = len(path) - 1
+        moves_here = candidates[depth]
+        i = cursor[depth]
+        if i < len(moves_here):
+            cursor[depth] = i + 1
+            square = moves_here[i]
+            move_num = depth + 1
+            visited[square] = 1
+            for n in neighbours[square]:
+                degree[n] -= 1
+            path.append(square)
+            stats["nodes"] += 1
+            yield MOVE, divmod(square, cols), move_num
+            if move_num == total - 1:
+                return True
+            candidates.append(_ordered_moves(visited, key, neighbours, square))
+            cursor.append(0)
+        else:
+            square = path.pop()
+            visited[square] = 0
+            for n in neighbours[square]:
+                degree[n] += 1
+            candidates.pop()
+            cursor.pop()
+            stats["backtracks"] += 1
+            yield BACKTRACK, divmod(square, cols), depth
+    return False
+
+
+# Pruning for _search_pruned. A square's effective degree is its number of
+# unvisited neighbours, plus one if the knight stands next to it. An unvisited
+# square with effective degree 0 can never be reached, and one with effective
+# degree 1 can only be the last square of the tour, so a position with any
+# square of the first kind or two of the second cannot be completed. Both
+# kinds are counted incrementally as degrees change.
+#
+# The unvisited squares must also stay connected to the knight. Leaving a
+# square can only split them through that square, so after each move a
+# breadth-first probe of at most CONNECTIVITY_PROBE squares checks that the
+# knight still reaches the old square's unvisited neighbours; only when the
+# probe is inconclusive is the whole remaining board flood-filled.
+PRUNING = ("none", "deadends", "connectivity")
+CONNECTIVITY_PROBE = 64
+
+
+def _reaches(visited, neighbours, square, targets, limit):
+    """Breadth-first search over unvisited squares from ``square``.
+
+    Returns True once every square in ``targets`` was reached, False if the
+    search ran out of squares, and None if it gave up after ``limit`` squares.
+    """
+    targets = set(targets)
+    targets.discard(square)
+    seen = {square}
+    frontier = [square]
+    while frontier and targets:
+        if len(seen) > limit:
+            return None
+        next_frontier = []
+        for sq in frontier:
+            for n in neighbours[sq]:
+                if not visited[n] and n not in seen:
+                    seen.add(n)
+                    targets.discard(n)
+                    next_frontier.append(n)
+        frontier = next_frontier
+    return not targets
+
+
+def _flood(visited, neighbours, square):
+    """Set of unvisited squares connected to ``square``, plus ``square`` itself"""
+    seen = {square}
+    stack = [square]
+    while stack:
+        for n in neighbours[stack.pop()]:
+            if not visited[n] and n not in seen:
+                seen.add(n)
+                stack.append(n)
+    return seen
+
+
+def _search_pruned(visited, degree, key, neighbours, cols, square, path, stats, trace, budget,
+                   connectivity):
+    # _search_iterative plus the dead-end checks above and, if
+    # ``connectivity``, the component check. Pruned positions are treated as
+    # squares without candidates, so the first tour found is the same one the
+    # unpruned search finds, only with fewer nodes.
+    total = len(visited)
+    candidates = []
+    cursor = []
+    check_at, check = budget
+    weak = sum(1 for d in degree if d <= 1)  # unvisited squares with degree <= 1
+    dead = sum(1 for d in degree if d == 0)  # unvisited squares with degree 0
+    remaining = total
+
+    def visit(square):
+        nonlocal weak, dead, remaining
+        visited[square] = 1
+        remaining -= 1
+        if degree[square] <= 1:
+            weak -= 1
+            dead -= degree[square] == 0
+        for n in neighbours[square]:
+            d = degree[n] - 1
+            degree[n] = d
+            if not visited[n]:
+                weak += d == 1
+                dead += d == 0
+
+    def unvisit(square):
+        nonlocal weak, dead, remaining
+        for n in neighbours[square]:
+            d = degree[n]
+            degree[n] = d + 1
+            if not visited[n]:
+                weak -= d == 1
+                dead -= d == 0
+        visited[square] = 0
+        remaining += 1
+        if degree[square] <= 1:
+            weak += 1
+            dead += degree[square] == 0
+
+    def feasible_moves(square, previous):
+        next_moves = _ordered_moves(visited, key, neighbours, square)
+        next_to_zero = sum(1 for n in next_moves if degree[n] == 0)
+        next_to_one = sum(1 for n in next_moves if degree[n] == 1)
+        if dead - next_to_zero > 0 or weak - next_to_one > 1:
+            stats["pruned"] += 1
+            return []
+        if connectivity:
+            if previous is None:
+                connected = len(_flood(visited, neighbours, square)) - 1 == remaining
+            else:
+                left_behind = [n for n in neighbours[previous] if not visited[n]]
+                connected = _reaches(visited, neighbours, square, left_behind, CONNECTIVITY_PROBE)
+                if connected is None:
+                    connected = len(_flood(visited, neighbours, square)) - 1 == remaining
+            if not connected:
+                stats["pruned"] += 1
+                return []
+        return next_moves
+
+    visit(square)
+    path.append(square)
+    stats["nodes"] += 1
+    if trace is not None:
+        trace.append((MOVE, divmod(square, cols), 0))
+    if total == 1:
+        return True
+    candidates.append(feasible_moves(square, None))
+    cursor.append(0)
+
+    while path:
+        depth = len(path) - 1
+        moves_here = candidates[depth]
+        i = cursor[depth]
+        if i < len(moves_here):
+            cursor[depth] = i + 1
+            square = moves_here[i]
+            move_num = depth + 1
+            visit(square)
+            path.append(square)
+            stats["nodes"] += 1
+            if trace is not None:
+                trace.append((MOVE, divmod(square, cols), move_num))
+            if move_num == total - 1:
+                return True
+            if stats["nodes"] >= check_at:
+                check_at = check(stats["nodes"])
+            candidates.append(feasible_moves(square, path[-2]))
+            cursor.append(0)
+        else:
+            # Backtrack: every candidate from this square failed
+            square = path.pop()
+            unvisit(square)
+            candidates.pop()
+            cursor.pop()
+            stats["backtracks"] += 1
+            if trace is not None:
+                trace.append((BACKTRACK, divmod(square, cols), depth))
+    return False
+
+
+def _search_bitboard(moves_from, cols, square, path, stats, trace, budget):
+    # _search_iterative on a bitboard: ``unvisited`` has one bit per free
+    # square, so visited tests are bit tests and a square's Warnsdorff degree
+    # is the popcount of its move mask restricted to the free squares. Nothing
+    # needs restoring on backtrack except the square's own bit. Candidates are
+    # kept as (degree, square) pairs.
+    total = len(moves_from)
+    candidates = []
+    cursor = []
+    nodes = backtracks = 0
+    check_at, check = budget
+
+    unvisited = ((1 << total) - 1) ^ (1 << square)
+    path.append(square)
+    nodes += 1
+    if trace is not None:
+        trace.append((MOVE, divmod(square, cols), 0))
+    if total == 1:
+        stats["nodes"] += nodes
+        return True
+    next_moves = [(_popcount(mask & unvisited), n) for bit, n, mask in moves_from[square]
+                  if bit & unvisited]
+    next_moves.sort(key=itemgetter(0))  # Stable: ties keep the order of MOVES
+    candidates.append(next_moves)
+    cursor.append(0)
+
+    solved = False
+    while path:
+        depth = len(path) - 1
+        moves_here = candidates[depth]
+        i = cursor[depth]
+        if i < len(moves_here):
+            cursor[depth] = i + 1
+            square = moves_here[i][1]
+            move_num = depth + 1
+            unvisited ^= 1 << square
+            path.append(square)
+            nodes += 1
+            if trace is not None:
+                trace.append((MOVE, divmod(square, cols), move_num))
+            if move_num == total - 1:
+                solved = True
+                break
+            if nodes >= check_at:
+                try:
+                    check_at = check(nodes)
+                except _Aborted:
+                    stats["nodes"] += nodes
+                    stats["backtracks"] += backtracks
+                    raise
+            next_moves = [(_popcount(mask & unvisited), n) for bit, n, mask in moves_from[square]
+                          if bit & unvisited]
+            next_moves.sort(key=itemgetter(0))
+            candidates.append(next_moves)
+            cursor.append(0)
+        else:
+            # Backtrack: every candidate from this square failed
+            square = path.pop()
+            unvisited |= 1 << square
+            candidates.pop()
+            cursor.pop()
+            backtracks += 1
+            if trace is not None:
+                trace.append((BACKTRACK, divmod(square, cols), depth))
+
+    stats["nodes"] += nodes
+    stats["backtracks"] += backtracks
+    return solved
+
+
+ENGINES = {
+    "iterative": _search_iterative,
+    "recursive": _search_recursive,
+}
+
+BACKENDS = ("auto", "list", "array", "bitboard")
+
+# The bitboard is used up to 64 squares; the bytearray backend costs a little
+# speed over plain lists, so it is only picked once memory starts to matter.
+ARRAY_BACKEND_MIN_SQUARES = 250_000
+
+
+def choose_backend(rows, cols, engine="iterative", tiebreak="moves", prune="none"):
+    """Pick the board representation for a board of ``rows`` x ``cols``"""
+    squares = rows * cols
+    if (squares <= 64 and engine == "iterative" and tiebreak in ("moves", "squirrel")
+            and prune == "none"):
+        return "bitboard"
+    if squares >= ARRAY_BACKEND_MIN_SQUARES:
+        return "array"
+    return "list"
+
+
+def _resolve_moves(rows, cols, moves, tiebreak):
+    """Move order for a search: ``moves``, the squirrel order or MOVES"""
+    if tiebreak == "squirrel":
+        if moves is not None:
+            raise ValueError("The squirrel tiebreak chooses its own move order")
+        moves = squirrel_moves(rows, cols)
+    moves = tuple(moves) if moves is not None else tuple(MOVES)
+    if sorted(moves) != sorted(MOVES):
+        raise ValueError(f"moves must be an ordering of the eight knight moves, got {moves}")
+    return moves
+
+
+def solve_knights_tour(rows=8, cols=None, start=(0, 0), trace=False, engine="iterative",
+                       backend="auto", moves=None, max_nodes=None, should_stop=None,
+                       tiebreak="moves", prune="none"):
+    """Solve the Knight's Tour using backtracking and Warnsdorff's heuristic.
+
+    ``cols`` defaults to ``rows`` (a square board). Returns a TourResult;
+    ``result.solved`` is False when no tour exists from ``start``. With
+    ``trace=True`` every placement and backtrack is recorded so a front-end
+    can replay the search.
+
+    ``engine`` is "iterative" (explicit stack, any board size) or
+    "recursive" (one Python frame per move, limited by the recursion limit to
+    boards of roughly 1000 squares). Both visit squares in the same order.
+
+    ``backend`` selects the board representation: "list", "array"
+    (bytearrays), "bitboard" (iterative engine, at most 64 squares) or
+    "auto", which picks one from the board size. All backends return the
+    same tour.
+
+    ``moves`` is the order in which tied candidates are tried (default
+    MOVES, see move_orders). The search gives up with ``result.aborted`` set
+    after placing ``max_nodes`` squares, or once ``should_stop()`` returns
+    True; it is polled every CHECK_INTERVAL squares.
+
+    ``tiebreak`` is the rule for candidates of equal degree, one of TIEBREAKS;
+    ``result.backtracks`` shows how well it did. "squirrel" chooses its own
+    move order, so it cannot be combined with ``moves``.
+
+    ``prune`` cuts off positions that cannot be completed: "deadends" (an
+    unreachable square, or two squares that could only be the last one) or
+    "connectivity" (also unvisited squares split into separate groups). It
+    never changes which tour is found, only how many nodes it takes; it needs
+    the iterative engine and the list or array backend.
+    """
+    if cols is None:
+        cols = rows
+    if rows < 1 or cols < 1:
+        raise ValueError(f"Board must have at least one square, got {rows}x{cols}")
+    start = tuple(start)
+    if not (0 <= start[0] < rows and 0 <= start[1] < cols):
+        raise ValueError(f"Start square {start} is outside a {rows}x{cols} board")
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}, expected one of {sorted(ENGINES)}")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {list(BACKENDS)}")
+    if tiebreak not in TIEBREAKS:
+        raise ValueError(f"Unknown tiebreak {tiebreak!r}, expected one of {list(TIEBREAKS)}")
+    if prune not in PRUNING:
+        raise ValueError(f"Unknown prune {prune!r}, expected one of {list(PRUNING)}")
+    if prune != "none" and engine != "iterative":
+        raise ValueError("Pruning needs the iterative engine")
+    if backend == "auto":
+        backend = choose_backend(rows, cols, engine, tiebreak, prune)
+    if backend == "bitboard" and (rows * cols > 64 or engine != "iterative"):
+        raise ValueError("The bitboard backend needs the iterative engine and at most 64 squares")
+    if backend == "bitboard" and tiebreak not in ("moves", "squirrel"):
+        raise ValueError(f"The bitboard backend does not support the {tiebreak!r} tiebreak")
+    if backend == "bitboard" and prune != "none":
+        raise ValueError("The bitboard backend does not support pruning")
+
+    moves = _resolve_moves(rows, cols, moves, tiebreak)
+    neighbours = neighbour_table(rows, cols, moves)
+    square = start[0] * cols + start[1]
+    path = []
+    stats = {"nodes": 0, "backtracks": 0, "pruned": 0}
+    events = [] if trace else None
+
+    budget = list(_budget(max_nodes, should_stop))
+    aborted = False
+
+    started = time.perf_counter()
+    try:
+        if backend == "bitboard":
+            _search_bitboard(_bitboard_moves(rows, cols, moves), cols, square, path, stats, events,
+                             budget)
+        else:
+            if backend == "array":
+                visited = bytearray(rows * cols)
+                degree = bytearray(len(n) for n in neighbours)
+            else:
+                visited = [0] * (rows * cols)
+                degree = [len(n) for n in neighbours]
+            key = _tiebreak_key(tiebreak, rows, cols, visited, degree, neighbours)
+            if prune != "none":
+                _search_pruned(visited, degree, key, neighbours, cols, square, path, stats, events,
+                               budget, connectivity=prune == "connectivity")
+            else:
+                ENGINES[engine](visited, degree, key, neighbours, cols, square, path, stats,
+                                events, budget)
+    except _Aborted:
+        aborted = True
+        path = []
+    elapsed = time.perf_counter() - started
+
+    return TourResult(rows=rows, cols=cols, start=start, path=[divmod(sq, cols) for sq in path],
+                      nodes=stats["nodes"], backtracks=stats["backtracks"], elapsed=elapsed,
+                      trace=events, aborted=aborted, tiebreak=tiebreak, pruned=stats["pruned"])
+
+
+def iter_knights_tour(rows=8, cols=None, start=(0, 0), moves=None, tiebreak="moves"):
+    """Run the search step by step, yielding its trace events as they happen.
+
+    Yields the same (kind, (row, col), move_num) events, in the same order,
+    as ``solve_knights_tour(..., trace=True).trace`` and returns the
+    TourResult (without a trace) as the generator's return value. The caller
+    decides how many steps to take at a time, so a front-end can animate a
+    long search without blocking its event loop.
+    """
+    if cols is None:
+        cols = rows
+    if rows < 1 or cols < 1:
+        raise ValueError(f"Board must have at least one square, got {rows}x{cols}")
+    start = tuple(start)
+    if not (0 <= start[0] < rows and 0 <= start[1] < cols):
+        raise ValueError(f"Start square {start} is outside a {rows}x{cols} board")
+    if tiebreak not in TIEBREAKS:
+        raise ValueError(f"Unknown tiebreak {tiebreak!r}, expected one of {list(TIEBREAKS)}")
+    neighbours = neighbour_table(rows, cols, _resolve_moves(rows, cols, moves, tiebreak))
+    visited = [0] * (rows * cols)
+    degree = [len(n) for n in neighbours]
+    key = _tiebreak_key(tiebreak, rows, cols, visited, degree, neighbours)
+    path = []
+    stats = {"nodes": 0, "backtracks": 0}
+
+    started = time.perf_counter()
+    yield from _search_steps(visited, degree, key, neighbours, cols,
+                             start[0] * cols + start[1], path, stats)
+    elapsed = time.perf_counter() - started
+
+    return TourResult(rows=rows, cols=cols, start=start, path=[divmod(sq, cols) for sq in path],
+                      nodes=stats["nodes"], backtracks=stats["backtracks"], elapsed=elapsed,
+                      tiebreak=tiebreak)
+
+
+def compare_tiebreaks(sizes, start=(0, 0), tiebreaks=TIEBREAKS, max_nodes_per_square=None):
+    """Solve square boards of each size with every tie-breaking rule.
+
+    Yields (size, tiebreak, TourResult). ``max_nodes_per_square`` bounds each
+    search to that many placements per square, so rules that backtrack badly
+    give up instead of running for hours.
+    """
+    for size in sizes:
+        max_nodes = None if max_nodes_per_square is None else max_nodes_per_square * size * size
+        for tiebreak in tiebreaks:
+            yield size, tiebreak, solve_knights_tour(size, start=start, tiebreak=tiebreak,
+                                                     max_nodes=max_nodes)
+
+
+# Parallel multi-start search. Every job is a solve_knights_tour call in a
+# worker process. The workers share a multiprocessing Event, handed over by
+# the pool initializer and polled as their should_stop, so once one tour is
+# found the running searches abort and the queued ones are cancelled.
+
+_stop_event = None
+
+
+def _init_worker(stop_event):
+    global _stop_event
+    _stop_event = stop_event
+
+
+def _solve_job(rows, cols, start, orders, max_nodes, backend, tiebreak, prune):
+    """Search from ``start`` with each move order in turn until one finds a tour"""
+    should_stop = _stop_event.is_set
+    result = None
+    for moves in orders:
+        result = solve_knights_tour(rows, cols, start=start, backend=backend, moves=moves,
+                                    max_nodes=max_nodes, should_stop=should_stop,
+                                    tiebreak=tiebreak, prune=prune)
+        if result.solved or should_stop():
+            break
+    return result
+
+
+def _start_squares(rows, cols, starts):
+    if starts is None:
+        return [(row, col) for row in range(rows) for col in range(cols)]
+    return [tuple(start) for start in starts]
+
+
+def _parallel_orders(variants, tiebreak):
+    if tiebreak == "squirrel":
+        if variants != 1:
+            raise ValueError("The squirrel tiebreak uses a single fixed move order")
+        return [None]
+    return move_orders(variants)
+
+
+def solve_parallel(rows=8, cols=None, starts=None, variants=1, workers=None, max_nodes=None,
+                   backend="auto", tiebreak="moves", prune="none"):
+    """Search from many start squares and move orders at once; return the first tour.
+
+    Every (start, move order) pair from ``starts`` (default: every square) and
+    move_orders(variants) is a job on a pool of ``workers`` processes
+    (default: one per core). ``max_nodes`` bounds each job so a start that
+    backtracks badly gives way to the others. Returns the first TourResult
+    with a tour, or None if no job found one.
+    """
+    if cols is None:
+        cols = rows
+    orders = _parallel_orders(variants, tiebreak)
+    stop_event = multiprocessing.Event()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(stop_event,)) as pool:
+        futures = [pool.submit(_solve_job, rows, cols, start, (moves,), max_nodes, backend,
+                               tiebreak, prune)
+                   for start in _start_squares(rows, cols, starts) for moves in orders]
+        try:
+            for future in as_completed(futures):
+                result = future.result()
+                if result.solved:
+                    return result
+        finally:
+            stop_event.set()
+            for future in futures:
+                future.cancel()
+    return None
+
+
+def iter_solve_parallel(rows=8, cols=None, starts=None, variants=1, workers=None,
+                        max_nodes=None, backend="auto", tiebreak="moves", prune="none"):
+    """Find a tour from every start square on a process pool.
+
+    Each start square (default: every square) is one job that tries up to
+    ``variants`` move orders, each bounded by ``max_nodes``. TourResults are
+    yielded in completion order; ``solved`` is False for starts where every
+    order failed. Closing the generator early aborts the remaining jobs.
+    """
+    if cols is None:
+        cols = rows
+    orders = _parallel_orders(variants, tiebreak)
+    stop_event = multiprocessing.Event()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(stop_event,)) as pool:
+        futures = [pool.submit(_solve_job, rows, cols, start, orders, max_nodes, backend,
+                               tiebreak, prune)
+                   for start in _start_squares(rows, cols, starts)]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            stop_event.set()
+            for future in futures:
+                future.cancel()
+
+
+# Divide-and-conquer construction (in the style of Parberry, 1997). The board
+# is cut into blocks of 5 to 10 rows and columns, each covered by a stored
+# tour: closed when the block has an even number of squares, open for the one
+# odd x odd block that can occur in the top-left corner. Blocks are merged one
+# at a time by swapping two edges across their shared border: a tour edge a-b
+# on one side and c-d on the other, where a-c and b-d are knight moves, are
+# replaced by a-c and b-d. Joining a path or cycle with a disjoint cycle this
+# way always gives a single path or cycle, so the result is one tour, built
+# in time linear in the number of squares and without any search.
+
+# Tours of small boards starting at (0, 0), as MOVES indices. Boards with an
+# even number of squares hold closed tours. Only rows <= cols is stored; the
+# other orientation is the transpose.
+BASE_TOURS = {
+    (5, 5): "461075242750423514637102",
+    (5, 6): "01642316751463610753200637502",
+    (5, 7): "0167246017525264052075224152713646",
+    (5, 8): "016724641522017572646107526057526750625",
+    (5, 9): "45064627575046423145225706713516341520625064",
+    (5, 10): "0164642357135046463143257102241527751463425152316",
+    (6, 6): "01462313501642314573205064327502617",
+    (6, 7): "01431646325754506423754407727106452631675",
+    (6, 8): "01431646235754506467023717646151732464517640773",
+    (6, 9): "01464632571350167264601520237067501643770167523141627",
+    (6, 10): "45246461052075242357024013175761326017162354146252645152317",
+    (7, 7): "464105752324601075723646157106427526015276153625",
+    (7, 8): "4524641057536360670207610136157520723641027017360443753",
+    (7, 9): "46461341052076175732646052015231335014625075232061701360236013",
+    (7, 10): "025014646237511523205264645201076175263714554313604327646114375407277",
+    (8, 8): "464010757341323607140463235014232571310143164320073254607766755",
+    (8, 9): "46461015753236464101345757607367246405310607536750523246605731043607173",
+    (8, 10): "4646010575734546462325757104075232063176464010761322710136113360255710663205313",
+    (9, 9): "45246401052076175732361163101431643322461076357014673645571102436162051673205310",
+    (9, 10): "02501046463237543571010254646250254323250275751644220152370502411737016635206451635320677",
+    (10, 10): "025010167064643163232543571764641076370001520233700152233435710104625763441777014261723461350736027",
+}
+
+
+@lru_cache(maxsize=None)
+def _base_tour(rows, cols):
+    """(row, col) squares of the stored tour of a small rows x cols block"""
+    if rows > cols:
+        return tuple((col, row) for row, col in _base_tour(cols, rows))
+    row, col = 0, 0
+    squares = [(row, col)]
+    for index in BASE_TOURS[(rows, cols)]:
+        dx, dy = MOVES[int(index)]
+        row, col = row + dx, col + dy
+        squares.append((row, col))
+    return tuple(squares)
+
+
+def _split_side(length):
+    """Block lengths (5 to 10) covering one side; an odd block only comes first"""
+    if length <= 10:
+        return [length]
+    if length % 2:
+        return [5] + _split_side(length - 5)
+    eights, rest = divmod(length, 8)
+    if rest == 0:
+        return [8] * eights
+    if rest == 2:
+        return [8] * (eights - 1) + [10]
+    if rest == 4:
+        return [8] * (eights - 1) + [6, 6]
+    return [8] * eights + [6]
+
+
+def _is_knight_move(a, b, cols):
+    dx, dy = abs(a // cols - b // cols), abs(a % cols - b % cols)
+    return (dx == 1 and dy == 2) or (dx == 2 and dy == 1)
+
+
+def _relink(link, square, old, new):
+    # Replace the tour neighbour ``old`` of ``square`` by ``new``
+    first, second = link
+    if first[square] == old:
+        first[square] = new
+    else:
+        second[square] = new
+
+
+def _merge_block(link, cols, strip, block):
+    """Join the tour of ``block`` to the tour containing the ``strip`` squares.
+
+    ``strip`` lists (square, row, col) of the already merged squares along
+    the border, and ``block`` is (row0, col0, rows, cols) of the new block.
+    """
+    first, second = link
+    row0, col0, height, width = block
+    for a, x, y in strip:
+        for dx, dy in MOVES:
+            c_x, c_y = x + dx, y + dy
+            if not (row0 <= c_x < row0 + height and col0 <= c_y < col0 + width):
+                continue
+            c = c_x * cols + c_y
+            for b in (first[a], second[a]):
+                if b == -1:
+                    continue
+                for d in (first[c], second[c]):
+                    if d != -1 and _is_knight_move(b, d, cols):
+                        _relink(link, a, b, c)
+                        _relink(link, b, a, d)
+                        _relink(link, c, d, a)
+                        _relink(link, d, c, b)
+                        return
+    raise RuntimeError(f"No edge swap found to merge block {block}")
+
+
+def construct_tour_squares(rows, cols=None, closed=None, start=(0, 0)):
+    """Build a tour without search and return its square numbers.
+
+    Square numbers are row * cols + col, returned as an ``array('i')``, which
+    is much lighter than a list of tuples on boards with millions of squares.
+    See construct_knights_tour for the parameters.
+    """
+    if cols is None:
+        cols = rows
+    if rows < 5 or cols < 5:
+        raise ValueError(f"Construction needs at least 5 rows and 5 columns, got {rows}x{cols}; "
+                         "use solve_knights_tour for smaller boards")
+    total = rows * cols
+    if closed is None:
+        closed = total % 2 == 0
+    elif closed and total % 2:
+        raise ValueError(f"A {rows}x{cols} board has an odd number of squares, "
+                         "so it has no closed tour")
+    start = tuple(start)
+    if not (0 <= start[0] < rows and 0 <= start[1] < cols):
+        raise ValueError(f"Start square {start} is outside a {rows}x{cols} board")
+
+    # first[sq] and second[sq] are the two tour neighbours of sq (-1 at the
+    # ends of a path)
+    first = array("i", bytes(4 * total))
+    second = array("i", bytes(4 * total))
+    link = (first, second)
+    row_bands, col_bands = _split_side(rows), _split_side(cols)
+    row0 = 0
+    for i, height in enumerate(row_bands):
+        col0 = 0
+        for j, width in enumerate(col_bands):
+            squares = [(row0 + x) * cols + col0 + y for x, y in _base_tour(height, width)]
+            cyclic = (height * width) % 2 == 0
+            last = len(squares) - 1
+            for k, sq in enumerate(squares):
+                first[sq] = squares[k - 1] if k > 0 or cyclic else -1
+                second[sq] = squares[k + 1] if k < last else (squares[0] if cyclic else -1)
+
+            # Merge with the block on the left, or for the first column with
+            # the block above, trying border squares nearest the middle first
+            block = (row0, col0, height, width)
+            if j > 0:
+                middle = row0 + height // 2
+                strip = [(x * cols + y, x, y) for x in sorted(range(row0, row0 + height),
+                                                                key=lambda x: abs(x - middle))
+                         for y in (col0 - 1, col0 - 2)]
+                _merge_block(link, cols, strip, block)
+            elif i > 0:
+                middle = col0 + width // 2
+                strip = [(x * cols + y, x, y) for y in sorted(range(col0, col0 + width),
+                                                                key=lambda y: abs(y - middle))
+                         for x in (row0 - 1, row0 - 2)]
+                _merge_block(link, cols, strip, block)
+            col0 += width
+        row0 += height
+
+    # Walk the tour. An open tour on an odd board runs between the ends of the
+    # corner block's path, one of them (0, 0); it is walked from there and then
+    # mirrored and/or reversed to start at ``start`` if a symmetry allows it.
+    square = 0 if total % 2 else start[0] * cols + start[1]
+    order = array("i", bytes(4 * total))
+    previous = -1
+    for k in range(total):
+        order[k] = square
+        following = first[square]
+        if following == previous or following == -1:
+            following = second[square]
+        previous, square = square, following
+    if total % 2:
+        order = _open_tour_from(order, rows, cols, start)
+    return order
+
+
+def _open_tour_from(order, rows, cols, start):
+    """The open tour ``order``, mirrored and/or reversed so that it starts at ``start``"""
+    def mapped(square, symmetry):
+        row, col = divmod(square, cols)
+        if symmetry & 1:
+            row = rows - 1 - row
+        if symmetry & 2:
+            col = cols - 1 - col
+        return (col, row) if symmetry & 4 else (row, col)
+
+    # Transposing only keeps the board when it is square
+    symmetries = range(8 if rows == cols else 4)
+    for symmetry in symmetries:
+        for end, step in ((order[0], 1), (order[-1], -1)):
+            if mapped(end, symmetry) == start:
+                if symmetry == 0:
+                    return order if step == 1 else array("i", reversed(order))
+                image = board_symmetry(rows, cols, symmetry)[2]
+                return array("i", (image[sq] for sq in order[::step]))
+    starts = sorted({mapped(end, symmetry) for symmetry in symmetries for end in (order[0], order[-1])})
+    raise ValueError(f"A constructed open tour of a {rows}x{cols} board starts at one of "
+                     f"{', '.join(map(str, starts))}, not {start}; "
+                     "use solve_knights_tour for other start squares")
+
+
+def construct_knights_tour(rows, cols=None, closed=None, start=(0, 0)):
+    """Build a Knight's Tour by divide and conquer instead of searching.
+
+    Works for any board with at least 5 rows and 5 columns, in time linear in
+    the number of squares. ``closed=None`` gives a closed tour whenever the
+    board has an even number of squares and an open one otherwise; closed
+    tours start at ``start``. Open tours on odd boards can only start at a
+    corner or a few other squares, and raise ValueError for any other start.
+    ``closed=False`` returns a closed tour's path without the final move back.
+    """
+    if cols is None:
+        cols = rows
+    started = time.perf_counter()
+    squares = construct_tour_squares(rows, cols, closed=closed, start=start)
+    elapsed = time.perf_counter() - started
+    path = [divmod(sq, cols) for sq in squares]
+    return TourResult(rows=rows, cols=cols, start=path[0], path=path, nodes=len(path),
+                      backtracks=0, elapsed=elapsed)
+
+
+def verify_tour(rows, cols, path, closed=False):
+    """Return True if ``path`` visits every square once by knight moves"""
+    if len(path) != rows * cols or len(set(path)) != rows * cols:
+        return False
+    if not all(0 <= row < rows and 0 <= col < cols for row, col in path):
+        return False
+    steps = zip(path, path[1:] + path[:1] if closed else path[1:])
+    return all(sorted((abs(a[0] - b[0]), abs(a[1] - b[1]))) == [1, 2] for a, b in steps)
+
+
+# Persistent tour cache. A search is deterministic, so its tour can be stored
+# once and loaded on later runs. Entries are keyed by board size, start square
+# and tie-break rule, in a canonical orientation: whichever of the 8 board
+# symmetries gives the smallest (rows, cols, start). Symmetric requests
+# therefore share one entry. A symmetric request gets the stored tour mapped
+# back, which is a valid tour from its start but not necessarily the one a
+# search from there would find. Proofs that no tour exists are cached too.
+
+DEFAULT_CACHE = "tour_cache.sqlite3"
+
+
+@lru_cache(maxsize=None)
+def board_symmetry(rows, cols, symmetry):
+    """Symmetry 0-7 of a ``rows`` x ``cols`` board as (rows, cols, square map).
+
+    Bit 0 flips the rows, bit 1 the columns and bit 2 transposes the board
+    (swapping its dimensions). The map is an array giving the image of every
+    square, both numbered row * cols + col on their own board.
+    """
+    new_rows, new_cols = (cols, rows) if symmetry & 4 else (rows, cols)
+    image = array("i", bytes(4 * rows * cols))
+    for square in range(rows * cols):
+        row, col = divmod(square, cols)
+        if symmetry & 1:
+            row = rows - 1 - row
+        if symmetry & 2:
+            col = cols - 1 - col
+        if symmetry & 4:
+            row, col = col, row
+        image[square] = row * new_cols + col
+    return new_rows, new_cols, image
+
+
+@lru_cache(maxsize=None)
+def _symmetry_inverse(rows, cols, symmetry):
+    """Square map undoing board_symmetry(rows, cols, symmetry)"""
+    image = board_symmetry(rows, cols, symmetry)[2]
+    inverse = array("i", bytes(4 * len(image)))
+    for square, mapped in enumerate(image):
+        inverse[mapped] = square
+    return inverse
+
+
+def _canonical(rows, cols, start):
+    """The symmetry taking (rows, cols, start) to its canonical orientation"""
+    square = start[0] * cols + start[1]
+    return min(range(8), key=lambda symmetry: (board_symmetry(rows, cols, symmetry)[:2],
+                                               board_symmetry(rows, cols, symmetry)[2][square]))
+
+
+class TourCache:
+    """On-disk store of searched tours, in an SQLite database.
+
+    Tours are stored as arrays of square numbers, two bytes per square (four
+    on boards of more than 65536 squares). Use as a context manager, or call
+    close() when done.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS tours (rows INTEGER, cols INTEGER, start INTEGER, "
+            "heuristic TEXT, tour BLOB, PRIMARY KEY (rows, cols, start, heuristic))")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    @staticmethod
+    def _typecode(rows, cols):
+        return "H" if rows * cols <= 1 << 16 else "I"
+
+    def get(self, rows, cols, start, heuristic):
+        """Stored tour as [(row, col), ...], [] if no tour exists, None if not cached"""
+        symmetry = _canonical(rows, cols, start)
+        key_rows, key_cols, image = board_symmetry(rows, cols, symmetry)
+        found = self.connection.execute(
+            "SELECT tour FROM tours WHERE rows = ? AND cols = ? AND start = ? AND heuristic = ?",
+            (key_rows, key_cols, image[start[0] * cols + start[1]], heuristic)).fetchone()
+        if found is None:
+            return None
+        stored = array(self._typecode(rows, cols))
+        stored.frombytes(found[0])
+        original = _symmetry_inverse(rows, cols, symmetry)
+        return [divmod(original[square], cols) for square in stored]
+
+    def put(self, rows, cols, start, heuristic, path):
+        """Store ``path`` ([(row, col), ...], or [] for no tour) for this search"""
+        symmetry = _canonical(rows, cols, start)
+        key_rows, key_cols, image = board_symmetry(rows, cols, symmetry)
+        stored = array(self._typecode(rows, cols),
+                       (image[row * cols + col] for row, col in path))
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO tours VALUES (?, ?, ?, ?, ?)",
+                (key_rows, key_cols, image[start[0] * cols + start[1]], heuristic,
+                 stored.tobytes()))
+
+
+def cached_solve(rows=8, cols=None, start=(0, 0), tiebreak="moves", cache=None,
+                 engine="iterative", backend="auto", prune="none", max_nodes=None):
+    """solve_knights_tour, loading the tour from ``cache`` when it is there.
+
+    ``cache`` is a TourCache (default: one on DEFAULT_CACHE, opened for this
+    call). A search that finishes, with or without a tour, is stored; an
+    aborted one is not. The other arguments are the solve_knights_tour
+    options that do not change which tour is found.
+    """
+    if cols is None:
+        cols = rows
+    start = tuple(start)
+    if cache is None:
+        with TourCache() as cache:
+            return cached_solve(rows, cols, start, tiebreak, cache, engine, backend, prune,
+                                max_nodes)
+
+    started = time.perf_counter()
+    path = cache.get(rows, cols, start, tiebreak)
+    if path is not None:
+        return TourResult(rows=rows, cols=cols, start=start, path=path,
+                          elapsed=time.perf_counter() - started, tiebreak=tiebreak, cached=True)
+    result = solve_knights_tour(rows, cols, start=start, engine=engine, backend=backend,
+                                max_nodes=max_nodes, tiebreak=tiebreak, prune=prune)
+    if not result.aborted:
+        cache.put(rows, cols, start, tiebreak, result.path)
+    return result
+
+
+# Tour counting. count_tours enumerates every tour of a small board. The
+# search tree is cut into independent jobs, one per path prefix of
+# ``split_depth`` moves, and the jobs run on a process pool. Open tours are
+# only counted from one start square per symmetry class, weighted by the size
+# of the class. Closed tours all pass through (0, 0), so they are counted from
+# there alone and halved to count each cycle once rather than once per
+# direction. Each worker memoizes the number of completions of the positions
+# it meets with at most ``memo_squares`` squares left. Those end-game
+# positions repeat across branches and across jobs.
+
+MEMO_SQUARES = 14
+MEMO_LIMIT = 4_000_000  # Entries per memo table before it is cleared
+
+_count_memos = {}  # (rows, cols, target) -> {free squares << 6 | square: completions}, per process
+
+
+@dataclass
+class TourCount:
+    """Outcome of count_tours"""
+    rows: int
+    cols: int
+    closed: bool
+    tours: int  # directed open tours, or undirected closed tours
+    jobs: int = 0
+    resumed: int = 0  # jobs whose counts were read from the checkpoint
+    elapsed: float = 0.0  # seconds
+
+
+def _count_completions(square, free, target, masks, memo, memo_squares):
+    """Number of ways to visit every square of ``free`` starting from ``square``"""
+    if not free:
+        return 1 if target is None or target >> square & 1 else 0
+    remember = _popcount(free) <= memo_squares
+    if remember:
+        key = free << 6 | square
+        found = memo.get(key)
+        if found is not None:
+            return found
+    total = 0
+    neighbours = masks[square] & free
+    options = neighbours
+    while options:
+        bit = options & -options
+        options ^= bit
+        rest = free ^ bit
+        # Moving on cuts the other free neighbours of ``square`` off from it;
+        # one with no free neighbour left, and not next to ``bit``, is lost
+        others = neighbours ^ bit
+        while others:
+            other = others & -others
+            others ^= other
+            if not masks[other.bit_length() - 1] & (rest | bit):
+                break
+        else:
+            total += _count_completions(bit.bit_length() - 1, rest, target, masks, memo,
+                                        memo_squares)
+    if remember:
+        if len(memo) >= MEMO_LIMIT:
+            memo.clear()
+        memo[key] = total
+    return total
+
+
+def _count_job(rows, cols, prefix, closed, memo_squares):
+    """Count the tours that begin with the squares in ``prefix``"""
+    masks = knight_masks(rows, cols)
+    target = masks[prefix[0]] if closed else None
+    memo = _count_memos.setdefault((rows, cols, target), {})
+    free = (1 << rows * cols) - 1
+    for square in prefix:
+        free ^= 1 << square
+    return _count_completions(prefix[-1], free, target, masks, memo, memo_squares)
+
+
+def _start_classes(rows, cols):
+    """{canonical start square: number of start squares symmetric to it}"""
+    symmetries = range(8) if rows == cols else range(4)
+    classes = {}
+    for square in range(rows * cols):
+        images = {board_symmetry(rows, cols, symmetry)[2][square] for symmetry in symmetries}
+        if square == min(images):
+            classes[square] = len(images)
+    return classes
+
+
+def _prefixes(rows, cols, start, depth):
+    """Every path of ``depth`` knight moves from ``start``, as square tuples"""
+    neighbours = neighbour_table(rows, cols)
+    prefixes = [(start,)]
+    for _ in range(min(depth, rows * cols - 1)):
+        prefixes = [prefix + (n,) for prefix in prefixes for n in neighbours[prefix[-1]]
+                    if n not in prefix]
+    return prefixes
+
+
+def _save_checkpoint(path, state):
+    temporary = path + ".tmp"
+    with open(temporary, "w") as file:
+        json.dump(state, file)
+    os.replace(temporary, path)
+
+
+def count_tours(rows, cols=None, closed=False, split_depth=3, workers=None, checkpoint=None,
+                memo_squares=MEMO_SQUARES):
+    """Count every open (directed) or closed (undirected) tour of a board.
+
+    The board must have at most 64 squares. On one core, 5x5 (1728 open
+    tours) takes about a second and 6x6 closed (9862 tours) about 13 minutes;
+    6x6 open and 6x7 take much longer and are best run with a checkpoint on
+    many cores. ``split_depth`` sets how many
+    moves each job's prefix covers, and so how many jobs run on the pool of
+    ``workers`` processes (default: one per core). With ``checkpoint``, a
+    JSON file path, every finished job is recorded there and a later call
+    with the same board and options skips the jobs already done.
+    """
+    if cols is None:
+        cols = rows
+    if rows < 1 or cols < 1 or rows * cols > 64:
+        raise ValueError(f"Can only count tours on boards of 1 to 64 squares, got {rows}x{cols}")
+    if closed:
+        starts = {0: 1}
+    else:
+        starts = _start_classes(rows, cols)
+    jobs = [(prefix, weight) for start, weight in starts.items()
+            for prefix in _prefixes(rows, cols, start, split_depth)]
+
+    options = {"rows": rows, "cols": cols, "closed": closed, "split_depth": split_depth}
+    state = {**options, "done": {}}
+    if checkpoint and os.path.exists(checkpoint):
+        with open(checkpoint) as file:
+            state = json.load(file)
+        if {key: state.get(key) for key in options} != options:
+            raise ValueError(f"Checkpoint {checkpoint} belongs to a different count: "
+                             f"{ {key: state.get(key) for key in options} }")
+    done = state["done"]
+    resumed = sum(1 for prefix, _ in jobs if ",".join(map(str, prefix)) in done)
+
+    started = time.perf_counter()
+    pending = [(prefix, weight) for prefix, weight in jobs
+               if ",".join(map(str, prefix)) not in done]
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_count_job, rows, cols, prefix, closed, memo_squares): prefix
+                       for prefix, _ in pending}
+            for future in as_completed(futures):
+                done[",".join(map(str, futures[future]))] = future.result()
+                if checkpoint:
+                    _save_checkpoint(checkpoint, state)
+
+    directed = sum(done[",".join(map(str, prefix))] * weight for prefix, weight in jobs)
+    return TourCount(rows=rows, cols=cols, closed=closed,
+                     tours=directed // 2 if closed and rows * cols > 2 else directed,
+                     jobs=len(jobs), resumed=resumed, elapsed=time.perf_counter() - started)
+
+
+# Batch random walks. random_walks advances many Warnsdorff walks in
+# lockstep with NumPy: each walk takes the unvisited neighbour of smallest
+# degree, breaking ties uniformly at random, and never backtracks. A walk
+# that runs out of moves before covering the board is marked as failed.
+# NumPy is only needed for this section.
+
+def random_walks(rows, cols=None, count=1000, start=(0, 0), seed=None):
+    """Run ``count`` random-tiebreak Warnsdorff walks at once.
+
+    ``start`` is a (row, col) for every walk, or None for a random start per
+    walk; ``seed`` seeds NumPy's random generator. Returns ``(tours,
+    failed)``: ``tours`` is a (count, rows * cols) int32 array of the squares
+    (row * cols + col) each walk visited in order, padded with -1 after a
+    failed walk got stuck, and ``failed`` is a boolean mask of those walks.
+    """
+    import numpy as np
+
+    if cols is None:
+        cols = rows
+    if rows < 1 or cols < 1:
+        raise ValueError(f"Board must have at least one square, got {rows}x{cols}")
+    squares = rows * cols
+    rng = np.random.default_rng(seed)
+
+    # Neighbour table padded with a sentinel square ``squares`` that is
+    # always visited, so every square has eight (possibly fake) neighbours
+    neighbours = np.full((squares + 1, 8), squares, dtype=np.int32)
+    for square, targets in enumerate(neighbour_table(rows, cols)):
+        neighbours[square, :len(targets)] = targets
+
+    walks = np.arange(count)
+    visited = np.zeros((count, squares + 1), dtype=bool)
+    visited[:, squares] = True
+    degree = np.repeat((neighbours[None, :squares] < squares).sum(axis=2, dtype=np.int8),
+                       count, axis=0)
+    degree = np.concatenate([degree, np.zeros((count, 1), dtype=np.int8)], axis=1)
+
+    if start is None:
+        current = rng.integers(squares, size=count, dtype=np.int32)
+    else:
+        row, col = start
+        if not (0 <= row < rows and 0 <= col < cols):
+            raise ValueError(f"Start square {tuple(start)} is outside a {rows}x{cols} board")
+        current = np.full(count, row * cols + col, dtype=np.int32)
+
+    tours = np.full((count, squares), -1, dtype=np.int32)
+    tours[:, 0] = current
+    failed = np.zeros(count, dtype=bool)
+    visited[walks, current] = True
+    degree[walks[:, None], neighbours[current]] -= 1
+
+    live = walks  # Indices of the walks still moving
+    for step in range(1, squares):
+        candidates = neighbours[current]
+        open_ = ~visited[live[:, None], candidates]
+        stuck = ~open_.any(axis=1)
+        if stuck.any():
+            failed[live[stuck]] = True
+            keep = ~stuck
+            live, current, candidates, open_ = (live[keep], current[keep], candidates[keep],
+                                                open_[keep])
+            if not len(live):
+                break
+
+        # Smallest degree first; the random fraction breaks ties uniformly
+        score = np.where(open_, degree[live[:, None], candidates], 9) + rng.random(open_.shape)
+        current = candidates[np.arange(len(live)), score.argmin(axis=1)]
+        tours[live, step] = current
+        visited[live, current] = True
+        degree[live[:, None], neighbours[current]] -= 1
+        degree[:, squares] = 0
+    return tours, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve the Knight's Tour without a display.")
+    parser.add_argument("--size", type=int, default=8, help="Board rows (default: 8)")
+    parser.add_argument("--cols", type=int, default=None, help="Board columns (default: same as --size)")
+    parser.add_argument("--start", type=int, nargs=2, default=(0, 0), metavar=("ROW", "COL"),
+                        help="Start square (default: 0 0)")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="iterative",
+                        help="Search engine (default: iterative)")
+    parser.add_argument("--backend", choices=BACKENDS, default="auto",
+                        help="Board representation (default: auto)")
+    parser.add_argument("--tiebreak", choices=TIEBREAKS, default="moves",
+                        help="Rule for Warnsdorff ties (default: moves)")
+    parser.add_argument("--prune", choices=PRUNING, default="none",
+                        help="Cut off positions that cannot become a tour (default: none)")
+    parser.add_argument("--compare-tiebreaks", type=int, nargs=2, metavar=("MIN", "MAX"),
+                        help="Report backtracks of every tiebreak on square boards MIN..MAX")
+    parser.add_argument("--construct", action="store_true",
+                        help="Build the tour by divide and conquer instead of searching")
+    parser.add_argument("--open", action="store_true",
+                        help="With --construct, return an open tour even if a closed one exists")
+    parser.add_argument("--parallel", action="store_true",
+                        help="Search from many start squares on all cores, stop at the first tour")
+    parser.add_argument("--all-starts", action="store_true",
+                        help="Search from every start square on all cores and report each one")
+    parser.add_argument("--variants", type=int, default=1,
+                        help="Tie-breaking move orders to try per start square (default: 1)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes for --parallel/--all-starts (default: one per core)")
+    parser.add_argument("--max-nodes", type=int, default=None,
+                        help="Give up a search after placing this many squares")
+    parser.add_argument("--count", choices=("open", "closed"),
+                        help="Count every open (directed) or closed tour of a board up to 64 squares")
+    parser.add_argument("--split-depth", type=int, default=3,
+                        help="With --count, moves per job prefix (default: 3)")
+    parser.add_argument("--checkpoint", metavar="PATH",
+                        help="With --count, record finished jobs in PATH and resume from it")
+    parser.add_argument("--random-walks", type=int, metavar="COUNT",
+                        help="Run COUNT random-tiebreak Warnsdorff walks with NumPy and report "
+                             "how many completed")
+    parser.add_argument("--random-starts", action="store_true",
+                        help="With --random-walks, start every walk on a random square")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for --random-walks")
+    parser.add_argument("--cache", nargs="?", const=DEFAULT_CACHE, metavar="PATH",
+                        help="Load the tour from, or store it in, an on-disk tour cache "
+                             f"(default path: {DEFAULT_CACHE})")
+    parser.add_argument("--quiet", action="store_true", help="Only print the statistics line")
+    args = parser.parse_args()
+
+    if args.compare_tiebreaks:
+        low, high = args.compare_tiebreaks
+        print(f"{'size':>5} " + " ".join(f"{tiebreak:>10}" for tiebreak in TIEBREAKS))
+        row = []
+        for size, tiebreak, result in compare_tiebreaks(range(low, high + 1), start=args.start,
+                                                        max_nodes_per_square=4):
+            row.append(f"{result.backtracks:>10}" if result.solved else f"{'failed':>10}")
+            if len(row) == len(TIEBREAKS):
+                print(f"{size:>5} " + " ".join(row))
+                row = []
+        return
+
+    if args.count:
+        count = count_tours(args.size, args.cols, closed=args.count == "closed",
+                            split_depth=args.split_depth, workers=args.workers,
+                            checkpoint=args.checkpoint)
+        print(f"{args.count} tours={count.tours} jobs={count.jobs} resumed={count.resumed} "
+              f"elapsed={count.elapsed:.4f}s")
+        return
+
+    if args.random_walks:
+        started = time.perf_counter()
+        tours, failed = random_walks(args.size, args.cols, args.random_walks,
+                                     start=None if args.random_starts else args.start,
+                                     seed=args.seed)
+        elapsed = time.perf_counter() - started
+        print(f"walks={len(tours)} completed={int((~failed).sum())} elapsed={elapsed:.4f}s")
+        return
+
+    if args.all_starts:
+        solved = 0
+        for result in iter_solve_parallel(args.size, args.cols, variants=args.variants,
+                                          workers=args.workers, max_nodes=args.max_nodes,
+                                          backend=args.backend, tiebreak=args.tiebreak,
+                                          prune=args.prune):
+            solved += result.solved
+            if not args.quiet:
+                status = "solved" if result.solved else "aborted" if result.aborted else "no tour"
+                print(f"{result.start}: {status} nodes={result.nodes} backtracks={result.backtracks}")
+        print(f"Tours found from {solved} start squares.")
+        return
+
+    if args.construct:
+        result = construct_knights_tour(args.size, args.cols, closed=False if args.open else None,
+                                        start=args.start)
+    elif args.parallel:
+        result = solve_parallel(args.size, args.cols, variants=args.variants, workers=args.workers,
+                                max_nodes=args.max_nodes, backend=args.backend,
+                                tiebreak=args.tiebreak, prune=args.prune)
+        if result is None:
+            print("No tour found from any start square.")
+            return
+    elif args.cache:
+        with TourCache(args.cache) as cache:
+            result = cached_solve(args.size, args.cols, start=args.start, tiebreak=args.tiebreak,
+                                  cache=cache, engine=args.engine, backend=args.backend,
+                                  prune=args.prune, max_nodes=args.max_nodes)
+    else:
+        result = solve_knights_tour(args.size, args.cols, start=args.start, engine=args.engine,
+                                    backend=args.backend, max_nodes=args.max_nodes,
+                                    tiebreak=args.tiebreak, prune=args.prune)
+    if result.solved:
+        if not args.quiet:
+            width = len(str(result.rows * result.cols))
+            for row in result.board():
+                print(" ".join(f"{n:>{width}}" for n in row))
+    elif result.aborted:
+        print(f"Gave up after {result.nodes} nodes starting from {result.start}.")
+    else:
+        print(f"No solution exists starting from {result.start}.")
+    pruned = f" pruned={result.pruned}" if result.pruned else ""
+    cached = " (cached)" if result.cached else ""
+    print(f"nodes={result.nodes} backtracks={result.backtracks}{pruned} "
+          f"elapsed={result.elapsed:.4f}s{cached}")
+
+
+if __name__ == "__main__":
+    main()